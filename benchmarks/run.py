@@ -0,0 +1,249 @@
+"""
+Runs the extended drivers against the stub WebDriver server and reports round trips and wall time per scenario.
+
+    python -m benchmarks.run                    # Compare against benchmarks/baseline.json.
+    python -m benchmarks.run --update-baseline  # Record a new baseline.
+
+Round trips are deterministic and any increase over the baseline is a regression. Wall time is only flagged when it
+exceeds the baseline by more than the tolerance factor, since it depends on the machine.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from extended_webdrivers import AsyncExtendedWebdriver, Remote  # noqa: E402
+from extended_webdrivers.chrome import ExtendedChromeMixin  # noqa: E402
+from extended_webdrivers.frame import Frame  # noqa: E402
+from extended_webdrivers.window import Window  # noqa: E402
+
+from .stub_server import StubWebDriver  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+class RemoteChrome(ExtendedChromeMixin, Remote):
+    """ The Chrome extensions driven through a remote executor instead of a local chromedriver. """
+
+    pass
+
+
+DRIVERS = {'Remote': Remote, 'Chrome': RemoteChrome}
+
+
+def find_click(browser, stub):
+    for _ in range(20):
+        browser.find_element_by_id('button').click()
+
+
+def attribute_read(browser, stub):
+    for _ in range(10):
+        element = browser.find_element_by_id('field')
+        element.get_attribute('value')
+        element.is_displayed()
+
+
+def table_scrape(browser, stub):
+    cells = browser.find_elements_by_css_selector('table td')
+    return [cell.text for cell in cells]
+
+
+def table_scrape_bulk(browser, stub):
+    return browser.js.get_properties('table td', ['text'])['text']
+
+
+def element_wait(browser, stub):
+    for _ in range(5):
+        browser.find_element_by_id('button').click()
+        browser.wait_for_element('#result', 'visible')
+
+
+PAGE_OBJECT = {f'field_{index}': ('id', f'field-{index}') for index in range(20)}
+
+
+def page_object(browser, stub):
+    return {name: browser.find_element(*locator) for name, locator in PAGE_OBJECT.items()}
+
+
+def page_object_bulk(browser, stub):
+    return browser.find_all(PAGE_OBJECT)
+
+
+def window_hop(browser, stub):
+    for handle in stub.handles[1:] * 5:
+        with Window(browser, child_window=handle, close_on_exit=False):
+            browser.find_element_by_id('content')
+
+
+def frame_hop(browser, stub):
+    for _ in range(5):
+        with Frame(browser.find_element_by_css_selector('iframe#outer')):
+            with Frame(browser.find_element_by_css_selector('iframe#inner')):
+                browser.find_element_by_id('content')
+
+
+def wait_for_stable(browser, stub):
+    for _ in range(5):
+        browser.find_element_by_id('button').click()
+        browser.wait_for_stable()
+
+
+# name: (scenario, stub server settings)
+SCENARIOS = {
+    'find_click': (find_click, {}),
+    'attribute_read': (attribute_read, {}),
+    'table_scrape': (table_scrape, {'table_cells': 100}),
+    'table_scrape_bulk': (table_scrape_bulk, {'table_cells': 100}),
+    'element_wait': (element_wait, {}),
+    'page_object': (page_object, {}),
+    'page_object_bulk': (page_object_bulk, {}),
+    'window_hop': (window_hop, {'windows': 3}),
+    'frame_hop': (frame_hop, {}),
+    'wait_for_stable': (wait_for_stable, {'angular': True, 'jquery': True, 'busy': 0.05}),
+}
+
+
+def run_scenario(driver_class, scenario, settings, latency):
+    with StubWebDriver(latency=latency, **settings) as stub:
+        browser = driver_class(
+            command_executor=stub.url, desired_capabilities={'browserName': 'chrome'}, keep_alive=True
+        )
+        try:
+            browser.get('http://stub.test/')
+            browser.wait_for_stable()
+            stub.reset_counters()
+            start = time.perf_counter()
+            scenario(browser, stub)
+            wall_time = time.perf_counter() - start
+            return {'round_trips': stub.requests, 'wall_time': round(wall_time, 4), 'commands': stub.commands}
+        finally:
+            browser.quit()
+
+
+async def async_find_click(browser, stub):
+    for _ in range(20):
+        await (await browser.find_element('id', 'button')).click()
+
+
+async def async_js_helpers(browser, stub):
+    element = await browser.find_element('id', 'button')
+    await browser.js.scroll_into_view(element)
+    await browser.js.focus(element)
+    return await browser.js.get_properties('table td', ['text'])
+
+
+async def async_cancelled(browser, stub):
+    for _ in range(5):
+        try:
+            await asyncio.wait_for(browser.title, stub.latency / 2)
+        except asyncio.TimeoutError:
+            pass
+        # The cancelled command's response must not be read as the reply to the next one.
+        url = await browser.current_url
+        assert url == 'http://stub.test/', url
+
+
+async def async_concurrent(browser, stub):
+    async def session():
+        async with AsyncExtendedWebdriver(stub.url, {'browserName': 'chrome'}) as other:
+            await other.get('http://stub.test/')
+            await (await other.find_element('id', 'button')).click()
+            await other.wait_for_stable()
+
+    await asyncio.gather(*(session() for _ in range(3)))
+
+
+ASYNC_SCENARIOS = {
+    'find_click': (async_find_click, {}),
+    'js_helpers': (async_js_helpers, {'table_cells': 100}),
+    'cancelled': (async_cancelled, {}),
+    'concurrent': (async_concurrent, {'angular': True, 'jquery': True, 'busy': 0.05}),
+}
+
+
+def run_async_scenario(scenario, settings, latency):
+    async def main():
+        async with AsyncExtendedWebdriver(stub.url, {'browserName': 'chrome'}) as browser:
+            await browser.get('http://stub.test/')
+            await browser.wait_for_stable()
+            stub.reset_counters()
+            start = time.perf_counter()
+            await scenario(browser, stub)
+            return time.perf_counter() - start
+
+    with StubWebDriver(latency=latency, **settings) as stub:
+        wall_time = asyncio.run(main())
+        return {'round_trips': stub.requests, 'wall_time': round(wall_time, 4), 'commands': stub.commands}
+
+
+def run(latency):
+    results = {}
+    for driver_name, driver_class in DRIVERS.items():
+        for scenario_name, (scenario, settings) in SCENARIOS.items():
+            results[f'{driver_name}/{scenario_name}'] = run_scenario(driver_class, scenario, settings, latency)
+    for scenario_name, (scenario, settings) in ASYNC_SCENARIOS.items():
+        results[f'Async/{scenario_name}'] = run_async_scenario(scenario, settings, latency)
+    return results
+
+
+# Wall time differences below this many seconds are noise, however large the factor.
+MIN_WALL_TIME_DELTA = 0.05
+
+
+def compare(results, baseline, tolerance):
+    """ Returns a description of every regression against the baseline. """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if result['round_trips'] > expected['round_trips']:
+            regressions.append(f'{name}: {result["round_trips"]} round trips, baseline {expected["round_trips"]}')
+        slower = result['wall_time'] - expected['wall_time']
+        if result['wall_time'] > expected['wall_time'] * tolerance and slower > MIN_WALL_TIME_DELTA:
+            regressions.append(f'{name}: {result["wall_time"]}s wall time, baseline {expected["wall_time"]}s')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.002, help='Seconds added to every request.')
+    parser.add_argument('--baseline', default=BASELINE, help='Baseline file to compare against or update.')
+    parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new baseline.')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='Allowed wall time factor over the baseline.')
+    parser.add_argument('--json', action='store_true', help='Print the full results as JSON.')
+    args = parser.parse_args(argv)
+
+    results = run(args.latency)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f'{"scenario":<32}{"round trips":>12}{"wall time":>12}')
+        for name, result in results.items():
+            print(f'{name:<32}{result["round_trips"]:>12}{result["wall_time"]:>11.3f}s')
+
+    if args.update_baseline:
+        keys = ('round_trips', 'wall_time')
+        baseline = {name: {key: result[key] for key in keys} for name, result in results.items()}
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}, run with --update-baseline to record one.')
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""
+A fake WebDriver HTTP server for benchmarking the extended drivers without a browser. It answers the W3C endpoints the
+drivers use, recognises the sync scripts they send and simulates command latency, Angular and jQuery busy periods after
+navigation and clicks, multiple windows and nested iframes.
+"""
+
+import itertools
+import json
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ELEMENT_KEY = 'element-6066-11e4-a52e-4f735466cecf'
+
+
+class StubWebDriver:
+    """ In-process fake WebDriver server. Every request counts as one round trip. """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        angular: bool = False,
+        jquery: bool = False,
+        busy: float = 0.0,
+        load_time: float = 0.0,
+        windows: int = 1,
+        table_cells: int = 100,
+    ):
+        """
+        :param latency: Seconds added to every request.
+        :param angular: Pages report Angular testabilities.
+        :param jquery: Pages report jQuery.
+        :param busy: Seconds Angular and jQuery stay busy after navigation or a click.
+        :param load_time: Seconds the document ready state stays 'loading' after navigation.
+        :param windows: Number of windows open when the session starts.
+        :param table_cells: Number of elements returned when finding table cells.
+        """
+        self.latency = latency
+        self.angular = angular
+        self.jquery = jquery
+        self.busy = busy
+        self.load_time = load_time
+        self.windows = windows
+        self.table_cells = table_cells
+        self.requests = 0
+        self.commands = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._ids = itertools.count(1)
+        self._reset_session()
+
+    def _reset_session(self):
+        self.handles = [f'window-{index}' for index in range(self.windows)]
+        self.current = self.handles[0]
+        self.frames = []
+        self.navigations = 0
+        self.busy_until = 0.0
+        self.loaded_at = 0.0
+        self.stamped = {}
+        self.helpers = {}
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'StubWebDriver':
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _handler(self))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.commands = {}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    # Page state.
+
+    def _touch(self):
+        """ Starts a busy period, as after a click or navigation. """
+        self.busy_until = time.monotonic() + self.busy
+
+    def _navigate(self):
+        self.navigations += 1
+        self.frames = []
+        self.loaded_at = time.monotonic() + self.load_time
+        self._touch()
+
+    def _idle(self):
+        return time.monotonic() >= self.busy_until
+
+    def _complete(self):
+        return time.monotonic() >= self.loaded_at
+
+    def _settle(self):
+        time.sleep(max(0.0, self.busy_until - time.monotonic(), self.loaded_at - time.monotonic()))
+
+    def _document(self):
+        return f'{self.current}:{"/".join(self.frames)}:{self.navigations}'
+
+    def _element(self, selector):
+        prefix = 'frame' if 'iframe' in selector else 'element'
+        return {ELEMENT_KEY: f'{prefix}-{next(self._ids)}'}
+
+    # Commands.
+
+    def handle(self, method, path, body):
+        """ Returns (status, value) for a request. """
+        if method == 'POST' and path == '/session':
+            self._reset_session()
+            return 200, {'sessionId': 'stub', 'capabilities': {'browserName': 'chrome'}}
+        match = re.match(r'^/session/[^/]+(/.*)?$', path)
+        if not match:
+            return 404, {'error': 'unknown command', 'message': path}
+        route = match.group(1) or ''
+        with self._lock:
+            key = f'{method} {re.sub(r"/(element|frame)-[0-9]+", "/:id", route)}'
+            self.commands[key] = self.commands.get(key, 0) + 1
+        return self._route(method, route, body)
+
+    def _route(self, method, route, body):
+        if method == 'DELETE' and route == '':
+            return 200, None
+        if route == '/url':
+            if method == 'POST':
+                self._navigate()
+                return 200, None
+            return 200, 'http://stub.test/'
+        if route in ('/refresh', '/back', '/forward'):
+            self._navigate()
+            return 200, None
+        if route == '/title':
+            return 200, 'Stub'
+        if route == '/window/handles':
+            return 200, list(self.handles)
+        if route == '/window':
+            if method == 'GET':
+                return 200, self.current
+            if method == 'POST':
+                if body['handle'] not in self.handles:
+                    return 404, {'error': 'no such window', 'message': body['handle']}
+                self.current = body['handle']
+                self.frames = []
+                return 200, None
+            self.handles.remove(self.current)
+            return 200, list(self.handles)
+        if route == '/frame':
+            frame = body.get('id')
+            if frame is None:
+                self.frames = []
+            else:
+                self.frames.append(str(frame[ELEMENT_KEY] if isinstance(frame, dict) else frame))
+            return 200, None
+        if route == '/frame/parent':
+            if self.frames:
+                self.frames.pop()
+            return 200, None
+        if route == '/timeouts' or route.startswith('/cookie'):
+            return 200, None
+        if route == '/element':
+            return 200, self._element(body['value'])
+        if route == '/elements':
+            count = self.table_cells if 'td' in body['value'] else 1
+            return 200, [self._element(body['value']) for _ in range(count)]
+        element = re.match(r'^/element/([^/]+)/(.+)$', route)
+        if element:
+            return self._element_command(element.group(1), element.group(2))
+        if route in ('/execute/sync', '/execute/async'):
+            return 200, self._script(body['script'], body['args'])
+        return 200, None
+
+    def _element_command(self, element_id, command):
+        if command == 'click':
+            self._touch()
+            return 200, None
+        if command == 'name':
+            return 200, 'iframe' if element_id.startswith('frame') else 'td'
+        if command == 'text':
+            return 200, f'text of {element_id}'
+        if command == 'displayed':
+            return 200, True
+        if command.startswith('attribute/'):
+            return 200, element_id
+        return 200, None
+
+    def _script(self, script, args):
+        """ Answers the scripts the drivers send, recognised by a distinctive fragment of each. """
+        # Batches embed other scripts, so they are recognised first.
+        if script.startswith('var operations'):
+            return [{'value': None} for _ in args[0]]
+        if '__extendedWebdriverHelpers' in script:
+            name, helper_args = args[0], args[1]
+            installed = self.helpers.setdefault(self._document(), set())
+            if '= function () {' in script:
+                installed.add(name)
+            elif name not in installed:
+                return {'missing': True}
+            return {'value': self._helper(name, helper_args)}
+        if 'MutationObserver' in script:
+            return {'found': [[self._element(target['value'])] for target in args[0]]}
+        if 'var locators' in script:
+            found = {}
+            for entry in args[0]:
+                element = self._element(entry['locator']['value'])
+                found[entry['name']] = [element] if entry['many'] else element
+            return found
+        if 'var known' in script:
+            document = self._document()
+            if document in args[0]:
+                return {'document': document}
+            return {'document': document, 'angular': self.angular, 'jquery': self.jquery}
+        if 'var status' in script:
+            idle = self._idle()
+            return {
+                'document': self._complete(),
+                'jquery': idle if self.jquery else None,
+                'angular': idle if self.angular else None,
+                'id': self._document(),
+            }
+        if 'syncDocument' in script or 'whenStable' in script:
+            self._settle()
+            return True
+        if 'jQuery.active == 0' in script:
+            return self._idle()
+        if 'isStable' in script:
+            return self._idle()
+        if "readyState == 'complete'" in script:
+            return self._complete()
+        if 'getAllAngularRootElements != undefined' in script:
+            return self.angular
+        if 'window.jQuery != undefined' in script:
+            return self.jquery
+        if 'window.frameElement' in script:
+            return {ELEMENT_KEY: self.frames[-1]} if self.frames else None
+        if 'var elements' in script:
+            count = self.table_cells if 'td' in str(args[0]) else len(args[0])
+            return {field: [f'{field} {index}' for index in range(count)] for field in args[1]}
+        if 'window.open' in script:
+            self.handles.append(f'window-{next(self._ids)}')
+            return None
+        return None
+
+    def _helper(self, name, args):
+        """ Answers the helpers installed through the script registry, by name. """
+        if name == 'angular.whenStable':
+            self._settle()
+        return None
+
+
+def _handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            super().setup()
+            # Headers and body are separate writes, so Nagle's algorithm would add a delayed ACK to every response.
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def log_message(self, format, *args):
+            pass
+
+        def _respond(self):
+            with stub._lock:
+                stub.requests += 1
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}') if length else {}
+            if stub.latency:
+                time.sleep(stub.latency)
+            status, value = stub.handle(self.command, self.path, body)
+            data = json.dumps({'value': value}).encode('UTF-8')
+            try:
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json;charset=UTF-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except ConnectionError:
+                # The client gave up on the request, e.g. a cancelled command of the async driver.
+                self.close_connection = True
+
+        do_GET = do_POST = do_DELETE = _respond
+
+    return Handler
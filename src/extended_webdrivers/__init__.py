@@ -3,15 +3,40 @@ Extends the funcionality of the selenium webdriver in Python with additional met
 Angular calls, change the geolocation of the browser, directly call javascript on elements, and more.
 """
 
-from .android import Android
-from .chrome import Chrome
-from .edge import Edge
-from .extended_webdriver import ExtendedWebdriver
-from .firefox import Firefox
-from .ie import Ie
-from .opera import Opera
-from .phantomjs import PhantomJS
-from .remote import Remote
-from .safari import Safari
+import importlib
+
+# The drivers are imported on first use, so importing one doesn't load every browser package of selenium.
+_EXPORTS = {
+    'Android': '.android',
+    'ArtifactWriter': '.artifacts',
+    'AsyncExtendedWebdriver': '.async_webdriver',
+    'Chrome': '.chrome',
+    'DriverPool': '.pool',
+    'Edge': '.edge',
+    'ExtendedWebdriver': '.extended_webdriver',
+    'Firefox': '.firefox',
+    'Ie': '.ie',
+    'Instrumentation': '.instrumentation',
+    'Opera': '.opera',
+    'PerformanceAggregator': '.performance',
+    'PhantomJS': '.phantomjs',
+    'PollScheduler': '.scheduler',
+    'Remote': '.remote',
+    'Safari': '.safari',
+}
+
+__all__ = sorted(_EXPORTS)
 
 __version__ = '0.5'
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,100 @@
+import base64
+import gzip
+import json
+import logging
+import os
+import queue
+import re
+import threading
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ArtifactWriter:
+    """
+    Saves artifacts from ExtendedWebdriver.capture_artifacts on a background thread, so decoding, compressing and
+    writing them doesn't hold up the test. Each capture is written as <name>.png, <name>.html.gz and <name>.json.gz.
+    When more captures are waiting than the queue holds, new ones are dropped and counted rather than blocking.
+
+    writer = ArtifactWriter('artifacts')
+    ...
+    except Exception:
+        writer.capture(browser, 'test_checkout')
+        raise
+    ...
+    writer.close()
+    """
+
+    def __init__(self, directory, max_queue: int = 16, compress: bool = True):
+        """
+        :param directory: Directory to write to. It is created if needed.
+        :param max_queue: The most captures waiting to be written at once.
+        :param compress: Gzip the page source and the JSON data.
+        """
+        self.directory = directory
+        self.compress = compress
+        self.dropped = 0
+        self._queue = queue.Queue(max_queue)
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='artifact-writer', daemon=True)
+        self._thread.start()
+
+    def capture(self, browser, name: str, **kwargs) -> bool:
+        """ Captures the browser's artifacts and queues them. Keyword arguments go to capture_artifacts. """
+        return self.submit(name, browser.capture_artifacts(**kwargs))
+
+    def submit(self, name: str, artifacts: dict) -> bool:
+        """ Queues artifacts to be written and returns False if they were dropped because the queue is full. """
+        try:
+            self._queue.put_nowait((name, artifacts))
+        except queue.Full:
+            self.dropped += 1
+            LOGGER.warning(f'Artifact queue is full, dropped {name}.')
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            except Exception:
+                LOGGER.exception(f'Failed to write artifacts for {item[0]}.')
+            finally:
+                self._queue.task_done()
+
+    def _open(self, path):
+        if self.compress:
+            return gzip.open(path + '.gz', 'wb')
+        return open(path, 'wb')
+
+    def _write(self, name: str, artifacts: dict) -> None:
+        artifacts = dict(artifacts)
+        path = os.path.join(self.directory, re.sub(r'[^\w.-]+', '_', name))
+        screenshot = artifacts.pop('screenshot', None)
+        if screenshot:
+            with open(path + '.png', 'wb') as f:
+                f.write(base64.b64decode(screenshot))
+        source = artifacts.pop('source', None)
+        if source is not None:
+            with self._open(path + '.html') as f:
+                f.write(source.encode('utf-8'))
+        with self._open(path + '.json') as f:
+            f.write(json.dumps(artifacts, indent=2, default=str).encode('utf-8'))
+
+    def flush(self) -> None:
+        """ Waits until every queued capture is written. """
+        self._queue.join()
+
+    def close(self) -> None:
+        """ Writes the queued captures and stops the background thread. """
+        self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
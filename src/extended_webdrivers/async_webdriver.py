@@ -0,0 +1,526 @@
+"""
+An asyncio counterpart to ExtendedWebdriver. It talks to the WebDriver wire protocol over a non-blocking HTTP/1.1
+connection, so a single process can drive many sessions at once while their waits overlap.
+"""
+
+import asyncio
+import json
+import ssl
+import string
+from urllib.parse import urljoin, urlparse
+
+from selenium.common.exceptions import JavascriptException, TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.errorhandler import ErrorCode, ErrorHandler
+from selenium.webdriver.remote.remote_connection import RemoteConnection
+from selenium.webdriver.remote.webdriver import _make_w3c_caps
+from selenium.webdriver.support.wait import POLL_FREQUENCY
+
+from .extended_webdriver import (
+    COMMANDS_NEEDING_RESYNC,
+    DETECTION_SCRIPT,
+    STABILITY_SCRIPT,
+    STABLE_WAIT_SCRIPT,
+    SYNC_INTERACT,
+    SYNC_MUTATE,
+    SYNC_POLICIES,
+    SYNC_READ,
+    ExtendedWebdriver,
+    Stability,
+    in_page_wait_margin,
+)
+from .js import AsyncJs
+from .locators import w3c_locator
+from .scripts import InlineScripts
+
+ELEMENT_KEY = 'element-6066-11e4-a52e-4f735466cecf'
+
+
+class AsyncRemoteConnection:
+    """ Sends wire protocol commands over a single keep-alive HTTP/1.1 connection using asyncio streams. """
+
+    def __init__(self, remote_server_addr: str, timeout: (None, float) = None):
+        url = urlparse(remote_server_addr)
+        self._host = url.hostname
+        self._port = url.port or (443 if url.scheme == 'https' else 80)
+        self._ssl = ssl.create_default_context() if url.scheme == 'https' else None
+        self._base_path = url.path.rstrip('/')
+        # Reuse selenium's command table so both drivers speak exactly the same protocol.
+        self._commands = RemoteConnection(remote_server_addr, resolve_ip=False)._commands
+        self._reader = None
+        self._writer = None
+        self._lock = None
+        self.timeout = timeout
+        self.w3c = True
+
+    async def execute(self, command, params):
+        method, path = self._commands[command]
+        path = string.Template(path).substitute(params)
+        if self.w3c and 'sessionId' in params:
+            params = {key: value for key, value in params.items() if key != 'sessionId'}
+        body = json.dumps(params) if method in ('POST', 'PUT') else None
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            return await asyncio.wait_for(self._request(method, self._base_path + path, body), self.timeout)
+
+    async def _request(self, method, path, body, retry=True):
+        reused = self._writer is not None
+        if not reused:
+            self._reader, self._writer = await asyncio.open_connection(self._host, self._port, ssl=self._ssl)
+        try:
+            status, headers, data = await self._send(method, path, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            await self.close()
+            # The server may have dropped an idle keep-alive connection, so retry once on a fresh one.
+            if reused and retry:
+                return await self._request(method, path, body, retry=False)
+            raise
+        except BaseException:
+            # A cancelled or timed out request would leave its response on the connection for the next command.
+            await self.close()
+            raise
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+
+        data = data.decode('UTF-8')
+        if 399 < status <= 500:
+            return {'status': status, 'value': data}
+        try:
+            data = json.loads(data.strip())
+        except ValueError:
+            code = ErrorCode.SUCCESS if 199 < status < 300 else ErrorCode.UNKNOWN_ERROR
+            return {'status': code, 'value': data.strip()}
+        if 'value' not in data:
+            data['value'] = None
+        return data
+
+    async def _send(self, method, path, body):
+        payload = body.encode('UTF-8') if body is not None else b''
+        request = [
+            f'{method} {path} HTTP/1.1',
+            f'Host: {self._host}:{self._port}',
+            'Accept: application/json',
+            'Connection: keep-alive',
+            f'Content-Length: {len(payload)}',
+        ]
+        if body is not None:
+            request.append('Content-Type: application/json;charset=UTF-8')
+        self._writer.write(('\r\n'.join(request) + '\r\n\r\n').encode('latin-1') + payload)
+        await self._writer.drain()
+
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionResetError('The remote end closed the connection.')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            data = b''
+            while True:
+                size = int((await self._reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await self._reader.readline()
+                    break
+                data += await self._reader.readexactly(size)
+                await self._reader.readline()
+        elif 'content-length' in headers:
+            data = await self._reader.readexactly(int(headers['content-length']))
+        else:
+            data = await self._reader.read()
+            headers['connection'] = 'close'
+        return status, headers, data
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+        self._reader = None
+        self._writer = None
+
+
+class AsyncWebElement:
+    """ A web element whose commands are coroutines. """
+
+    def __init__(self, parent, id_):
+        self.parent = parent
+        self.id = id_
+
+    def __repr__(self):
+        name = f'{type(self).__module__}.{type(self).__name__}'
+        return f'<{name} (session="{self.parent.session_id}", element="{self.id}")>'
+
+    def __eq__(self, element):
+        return isinstance(element, AsyncWebElement) and self.id == element.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    async def _execute(self, command, params=None):
+        params = dict(params or {})
+        params['id'] = self.id
+        return (await self.parent.execute(command, params))['value']
+
+    @property
+    def text(self):
+        """ Awaitable text of the element. """
+        return self._execute(Command.GET_ELEMENT_TEXT)
+
+    @property
+    def tag_name(self):
+        """ Awaitable tag name of the element. """
+        return self._execute(Command.GET_ELEMENT_TAG_NAME)
+
+    async def click(self):
+        await self._execute(Command.CLICK_ELEMENT)
+
+    async def clear(self):
+        await self._execute(Command.CLEAR_ELEMENT)
+
+    async def send_keys(self, *value):
+        text = ''.join(str(item) for item in value)
+        await self._execute(Command.SEND_KEYS_TO_ELEMENT, {'text': text, 'value': list(text)})
+
+    async def get_attribute(self, name):
+        """ Gets an element's attribute, falling back to the DOM property like selenium does. """
+        with self.parent.read_only():
+            result = self.parent.execute_script(
+                'var e = arguments[0]; var v = e.getAttribute(arguments[1]); return v === null ? e[arguments[1]] : v;',
+                self,
+                name,
+            )
+        return await result
+
+    async def is_displayed(self):
+        return await self._execute(Command.IS_ELEMENT_DISPLAYED)
+
+    async def is_enabled(self):
+        return await self._execute(Command.IS_ELEMENT_ENABLED)
+
+    async def is_selected(self):
+        return await self._execute(Command.IS_ELEMENT_SELECTED)
+
+    async def find_element(self, by=By.ID, value=None):
+        by, value = w3c_locator(by, value)
+        return await self._execute(Command.FIND_CHILD_ELEMENT, {'using': by, 'value': value})
+
+    async def find_elements(self, by=By.ID, value=None):
+        by, value = w3c_locator(by, value)
+        return await self._execute(Command.FIND_CHILD_ELEMENTS, {'using': by, 'value': value})
+
+
+class AsyncExtendedWebdriver:
+    """
+    Asyncio counterpart to ExtendedWebdriver. Commands are coroutines and the implicit sync before reads and
+    interactions follows the same probe, stable epoch and detection cache as the blocking driver.
+
+    async with AsyncExtendedWebdriver('http://127.0.0.1:4444/wd/hub', {'browserName': 'chrome'}) as browser:
+        await browser.get('https://angular.io/')
+        await browser.wait_for_stable()
+        await browser.js.click(await browser.find_element(By.ID, 'search'))
+    """
+
+    def __init__(
+        self,
+        command_executor='http://127.0.0.1:4444/wd/hub',
+        desired_capabilities=None,
+        base_url=None,
+        sync_angular=True,
+        sync_jquery=True,
+        sync_document=True,
+        sync_in_browser=False,
+        stable_freshness=None,
+    ):
+        if isinstance(command_executor, str):
+            command_executor = AsyncRemoteConnection(command_executor)
+        self.command_executor = command_executor
+        self.desired_capabilities = dict(desired_capabilities or {})
+        self.base_url = base_url
+        self.sync_angular = sync_angular
+        self.sync_jquery = sync_jquery
+        self.sync_document = sync_document
+        self.sync_in_browser = sync_in_browser
+        self.sync_policies = dict(SYNC_POLICIES)
+        self.stable_freshness = stable_freshness
+        self.session_id = None
+        self.capabilities = {}
+        self.w3c = True
+        self.error_handler = ErrorHandler()
+        # Retrying a missing helper would have to await inside the registry, so scripts are always sent in full.
+        self.scripts = InlineScripts(self)
+        self.js = AsyncJs(self)
+        self.angular = False
+        self.jquery = False
+        self._script_timeout = 30
+        self._epoch = 0
+        self._stable_epoch = None
+        self._stable_at = 0.0
+        self._read_only_depth = 0
+        self._detection_cache = {}
+        self._window_handle = None
+        self._window_handles = None
+        self._frame_stack = []
+        self._document_id = None
+
+    # The stable epoch and context bookkeeping never talk to the browser, so it is shared with the blocking driver.
+    known_stable = ExtendedWebdriver.known_stable
+    mark_dirty = ExtendedWebdriver.mark_dirty
+    _mark_stable = ExtendedWebdriver._mark_stable
+    read_only = ExtendedWebdriver.read_only
+    _track_context = ExtendedWebdriver._track_context
+    _cache_detection = ExtendedWebdriver._cache_detection
+    _frame_path = ExtendedWebdriver._frame_path
+
+    async def __aenter__(self):
+        await self.start_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.quit()
+
+    async def start_session(self):
+        parameters = {
+            'capabilities': _make_w3c_caps(self.desired_capabilities),
+            'desiredCapabilities': self.desired_capabilities,
+        }
+        response = await self.execute(Command.NEW_SESSION, parameters)
+        if 'sessionId' not in response:
+            response = response['value']
+        self.session_id = response['sessionId']
+        self.capabilities = response.get('value') or response.get('capabilities')
+        self.w3c = response.get('status') is None
+        self.command_executor.w3c = self.w3c
+
+    async def quit(self):
+        try:
+            await self.execute(Command.QUIT)
+        finally:
+            self.session_id = None
+            if hasattr(self.command_executor, 'close'):
+                await self.command_executor.close()
+
+    async def execute(self, driver_command, params=None, read_only=False):
+        policy = self.sync_policies.get(driver_command)
+        if policy in (SYNC_READ, SYNC_INTERACT):
+            if not self.known_stable:
+                await self._sync()
+            result = await self._send(driver_command, params)
+            if policy == SYNC_INTERACT:
+                self.mark_dirty()
+            return result
+        result = await self._send(driver_command, params)
+        if policy == SYNC_MUTATE and (not read_only or driver_command in COMMANDS_NEEDING_RESYNC):
+            self.mark_dirty()
+        self._track_context(driver_command, params)
+        if driver_command in COMMANDS_NEEDING_RESYNC:
+            await self._detect_frameworks()
+        return result
+
+    async def _send(self, driver_command, params):
+        params = dict(params or {})
+        if self.session_id is not None:
+            params.setdefault('sessionId', self.session_id)
+        response = await self.command_executor.execute(driver_command, self._wrap_value(params))
+        if response:
+            self.error_handler.check_response(response)
+            response['value'] = self._unwrap_value(response.get('value', None))
+            return response
+        return {'success': 0, 'value': None, 'sessionId': self.session_id}
+
+    def _wrap_value(self, value):
+        if isinstance(value, dict):
+            return {key: self._wrap_value(item) for key, item in value.items()}
+        if isinstance(value, AsyncWebElement):
+            return {'ELEMENT': value.id, ELEMENT_KEY: value.id}
+        if isinstance(value, (list, tuple)):
+            return [self._wrap_value(item) for item in value]
+        return value
+
+    def _unwrap_value(self, value):
+        if isinstance(value, dict):
+            if 'ELEMENT' in value or ELEMENT_KEY in value:
+                return AsyncWebElement(self, value.get('ELEMENT') or value[ELEMENT_KEY])
+            return {key: self._unwrap_value(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._unwrap_value(item) for item in value]
+        return value
+
+    def execute_script(self, script, *args):
+        """ Returns an awaitable that runs the script. Read-only state is captured when it is called. """
+        return self._execute_script(script, args, self._read_only_depth > 0)
+
+    def execute_async_script(self, script, *args):
+        """ Returns an awaitable that runs the asynchronous script. Read-only state is captured when it is called. """
+        return self._execute_script(script, args, self._read_only_depth > 0, asynchronous=True)
+
+    async def _execute_script(self, script, args, read_only, asynchronous=False):
+        if asynchronous:
+            command = Command.W3C_EXECUTE_SCRIPT_ASYNC if self.w3c else Command.EXECUTE_ASYNC_SCRIPT
+        else:
+            command = Command.W3C_EXECUTE_SCRIPT if self.w3c else Command.EXECUTE_SCRIPT
+        params = {'script': script, 'args': list(args)}
+        return (await self.execute(command, params, read_only=read_only))['value']
+
+    async def get(self, url):
+        if self.base_url and self.base_url not in url:
+            url = urljoin(str(self.base_url), str(url))
+        await self.execute(Command.GET, {'url': url})
+
+    async def set_script_timeout(self, time_to_wait):
+        if self.w3c:
+            await self.execute(Command.SET_TIMEOUTS, {'script': int(float(time_to_wait) * 1000)})
+        else:
+            await self.execute(Command.SET_SCRIPT_TIMEOUT, {'ms': float(time_to_wait) * 1000})
+        self._script_timeout = time_to_wait
+
+    async def find_element(self, by=By.ID, value=None):
+        by, value = w3c_locator(by, value) if self.w3c else (by, value)
+        return (await self.execute(Command.FIND_ELEMENT, {'using': by, 'value': value}))['value']
+
+    async def find_elements(self, by=By.ID, value=None):
+        by, value = w3c_locator(by, value) if self.w3c else (by, value)
+        return (await self.execute(Command.FIND_ELEMENTS, {'using': by, 'value': value}))['value'] or []
+
+    @property
+    def current_url(self):
+        """ Awaitable URL of the current page. """
+        return self._value(Command.GET_CURRENT_URL)
+
+    @property
+    def title(self):
+        """ Awaitable title of the current page. """
+        return self._value(Command.GET_TITLE)
+
+    async def _value(self, command):
+        return (await self.execute(command))['value']
+
+    async def _detect_frameworks(self):
+        context = (self._window_handle, self._frame_path)
+        known = [key[2] for key in self._detection_cache if key[:2] == context]
+        try:
+            result = await self._execute_script(DETECTION_SCRIPT, [known], True)
+        except JavascriptException:
+            result = None
+        if not result:
+            self._document_id = None
+            self.angular = self.jquery = False
+            return
+        self._document_id = result['document']
+        key = context + (self._document_id,)
+        if 'angular' in result:
+            self._cache_detection(key, (result['angular'], result['jquery']))
+        self.angular, self.jquery = self._detection_cache[key]
+
+    async def get_stability(self) -> Stability:
+        """ Checks the document ready state, jQuery and Angular testabilities in one round trip. """
+        status = await self._execute_script(STABILITY_SCRIPT, [], True) or {}
+        stability = Stability(status.get('document', True), status.get('jquery'), status.get('angular'))
+        self.angular = stability.angular is not None
+        self.jquery = stability.jquery is not None
+        self._document_id = status.get('id')
+        key = (self._window_handle, self._frame_path, self._document_id)
+        if self._document_id is not None:
+            self._cache_detection(key, (self.angular, self.jquery))
+        if stability.ready:
+            self._mark_stable()
+        return stability
+
+    async def is_stable(self) -> bool:
+        return (await self.get_stability()).ready
+
+    def _settled(self, stability: Stability) -> bool:
+        """ Returns if the parts of the page the driver is configured to sync on are idle. """
+        return (
+            (not self.sync_document or bool(stability.document))
+            and (not self.sync_jquery or stability.jquery is not False)
+            and (not self.sync_angular or stability.angular is not False)
+        )
+
+    async def _sync(self):
+        if not (self.sync_angular or self.sync_jquery or self.sync_document):
+            self._mark_stable()
+            return
+        stability = await self.get_stability()
+        if not self._settled(stability):
+            if self.sync_in_browser:
+                await self.wait_in_browser(self.sync_document, self.sync_jquery, self.sync_angular)
+            else:
+                await self._poll(self._settled, POLL_FREQUENCY, self._script_timeout)
+        self._mark_stable()
+
+    async def _poll(self, condition, poll_frequency, timeout, quiet: float = 0.0, immediate: bool = False):
+        """ Polls until the condition holds for the quiet period, checking right away when immediate is set. """
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        held_since = None
+        while True:
+            if not immediate:
+                delay = poll_frequency
+                if held_since is not None:
+                    delay = min(delay, max(0.0, held_since + quiet - loop.time()))
+                await asyncio.sleep(delay)
+            immediate = False
+            now = loop.time()
+            if condition(await self.get_stability()):
+                if held_since is None:
+                    held_since = now
+                if now - held_since >= quiet:
+                    return
+            else:
+                held_since = None
+            if loop.time() > deadline:
+                raise TimeoutException(f'Page not stable after {timeout} seconds.')
+
+    async def wait_in_browser(
+        self, document: bool = True, jquery: bool = True, angular: bool = True, timeout: (None, int) = None
+    ) -> None:
+        """ Waits for the page to settle with a single asynchronous script. See ExtendedWebdriver.wait_in_browser. """
+        if timeout is None:
+            timeout = self._script_timeout - in_page_wait_margin(self._script_timeout)
+        # The page ends the wait itself, the script timeout only has to outlast it.
+        restore_timeout = timeout + in_page_wait_margin(timeout) > self._script_timeout
+        if restore_timeout:
+            script_timeout = self._script_timeout
+            await self.set_script_timeout(timeout + in_page_wait_margin(timeout))
+        try:
+            args = [document, jquery, angular, timeout]
+            settled = await self._execute_script(STABLE_WAIT_SCRIPT, args, True, asynchronous=True)
+        finally:
+            if restore_timeout:
+                await self.set_script_timeout(script_timeout)
+        if not settled:
+            raise TimeoutException(f'Page not stable after {timeout} seconds.')
+
+    async def wait_for_stable(
+        self,
+        pause: float = 0.0,
+        poll_frequency: float = POLL_FREQUENCY,
+        timeout: (None, int) = None,
+        in_browser: (None, bool) = None,
+    ) -> None:
+        """
+        Waits for the document, jQuery and Angular to be ready and to stay ready for pause seconds. See
+        ExtendedWebdriver.wait_for_stable, except that polls are poll_frequency apart instead of backing off.
+        """
+        if in_browser is None:
+            in_browser = self.sync_in_browser
+        if in_browser:
+            await self.wait_in_browser(timeout=timeout)
+            if not pause:
+                self._mark_stable()
+                return
+        if timeout is None:
+            timeout = self._script_timeout
+        await self._poll(lambda stability: stability.ready, poll_frequency, timeout, quiet=pause, immediate=True)
+
+    wait_stable = wait_for_stable
@@ -1,11 +1,147 @@
-from selenium.common.exceptions import WebDriverException
+from contextlib import contextmanager
+
+from selenium.common.exceptions import NoSuchWindowException, TimeoutException, WebDriverException
 from selenium.webdriver import Chrome as _Chrome
 
-from .extended_webdriver import ExtendedWebdriver
-from .window import Window
+from .extended_webdriver import ExtendedWebdriver, _instrumented, _read_only
+
+# Counts the fetch and XHR requests in flight in the page. Installed on every new document through the DevTools
+# protocol where possible, otherwise on the current document when it is first waited on. A late install can't see
+# requests that are already running, so it takes the end of the last finished resource as the last activity.
+NETWORK_MONITOR_SCRIPT = '''(function () {
+    if (window.__extendedWebdriverNetwork) {
+        return;
+    }
+    var monitor = {inFlight: 0, lastActivity: 0};
+    if (document.readyState != 'loading' && window.performance && performance.getEntriesByType) {
+        performance.getEntriesByType('resource').forEach((entry) => {
+            monitor.lastActivity = Math.max(monitor.lastActivity, entry.responseEnd);
+        });
+    }
+    window.__extendedWebdriverNetwork = monitor;
+
+    function start() {
+        monitor.inFlight++;
+        monitor.lastActivity = performance.now();
+    }
+
+    function end() {
+        monitor.inFlight = Math.max(0, monitor.inFlight - 1);
+        monitor.lastActivity = performance.now();
+    }
+
+    if (window.fetch) {
+        var fetch = window.fetch;
+        window.fetch = function () {
+            start();
+            try {
+                var request = fetch.apply(this, arguments);
+            } catch (e) {
+                end();
+                throw e;
+            }
+            request.then(end, end);
+            return request;
+        };
+    }
+    var send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        var finished = false;
+        var finish = () => {
+            if (!finished) {
+                finished = true;
+                end();
+            }
+        };
+        start();
+        this.addEventListener('loadend', finish);
+        try {
+            return send.apply(this, arguments);
+        } catch (e) {
+            finish();
+            throw e;
+        }
+    };
+})();'''
+
+NETWORK_IDLE_SCRIPT = (
+    NETWORK_MONITOR_SCRIPT
+    + '''
+var quietPeriod = arguments[0] * 1000;
+var deadline = performance.now() + arguments[1] * 1000;
+var callback = arguments[arguments.length - 1];
+var monitor = window.__extendedWebdriverNetwork;
+
+function check() {
+    var now = performance.now();
+    var quiet = now - monitor.lastActivity;
+    if (monitor.inFlight == 0 && quiet >= quietPeriod) {
+        callback(true);
+        return;
+    }
+    if (now >= deadline) {
+        callback(false);
+        return;
+    }
+    setTimeout(check, Math.min(monitor.inFlight ? 25 : quietPeriod - quiet + 1, deadline - now));
+}
+check();'''
+)
 
 
 class ExtendedChromeMixin(ExtendedWebdriver):
+    def __init__(self, *args, sync_network: bool = False, network_quiet_period: float = 0.5, **kwargs):
+        """
+        :param sync_network: Also wait for the page's fetch and XHR requests before commands that need a stable page.
+                             Requests made by frameworks other than jQuery and Angular are otherwise invisible.
+        :param network_quiet_period: Seconds the page must go without requests to be considered idle.
+        """
+        self.sync_network = sync_network
+        self.network_quiet_period = network_quiet_period
+        self._network_monitor_pinned = False
+        self._settings_window = None
+        self._default_zoom = None
+        super().__init__(*args, **kwargs)
+
+    @property
+    def window_handles(self):
+        """ Returns the handles of all windows except the background settings tab. """
+        handles = super().window_handles
+        if self._settings_window in handles:
+            handles.remove(self._settings_window)
+        return handles
+
+    @_read_only
+    def _sync(self):
+        if self.sync_network:
+            self.wait_for_network_idle()
+        super()._sync()
+
+    def _pin_network_monitor(self):
+        """ Installs the network monitor on every new document before the page's own scripts run, when possible. """
+        self._network_monitor_pinned = True
+        # Where pinning isn't supported the monitor is installed by the wait instead.
+        self.scripts.pin(NETWORK_MONITOR_SCRIPT)
+
+    @_instrumented('network')
+    @_read_only
+    def wait_for_network_idle(self, quiet_period: (None, float) = None, timeout: (None, int) = None) -> None:
+        """
+        Waits inside the page until no fetch or XHR request has been in flight for the quiet period.
+
+        :param quiet_period: Seconds without requests. The default is determined by network_quiet_period.
+        :param timeout: The amount of time in seconds to wait. The default time is determined by the current script
+                        timeout.
+        """
+        if not self._network_monitor_pinned:
+            self._pin_network_monitor()
+        if quiet_period is None:
+            quiet_period = self.network_quiet_period
+        with self._in_page_wait(timeout) as timeout:
+            idle = self.execute_async_script(NETWORK_IDLE_SCRIPT, quiet_period, timeout)
+        if not idle:
+            raise TimeoutException(f'Network not idle after {timeout} seconds.')
+
     def is_online(self):
         try:
             return self.get_network_conditions()['offline'] is False
@@ -15,11 +151,15 @@ class ExtendedChromeMixin(ExtendedWebdriver):
     def is_offline(self):
         return not self.is_online()
 
-    def is_open(self):
+    def reset_state(self, blank_page: bool = True) -> None:
+        """ Also restores the network conditions if they were changed. """
+        super().reset_state(blank_page)
         try:
-            return self.current_url is not None
+            self.get_network_conditions()
         except WebDriverException:
-            return False
+            # Network conditions were never set.
+            return
+        self.set_network_conditions(offline=False, latency=0, throughput=0)
 
     @property
     def online(self):
@@ -29,28 +169,53 @@ class ExtendedChromeMixin(ExtendedWebdriver):
     def offline(self):
         return OfflineContextManager(self)
 
+    @contextmanager
+    def _settings(self):
+        """
+        Switches to a background chrome://settings tab, opened on first use and kept for later calls, and back to the
+        current window and frame afterwards. The trip doesn't change the current document, so it doesn't resync.
+        """
+        window = self.current_window_handle
+        path = self.frame_path
+        with self._window_hop(), self._preserve_sync_state():
+            if self._settings_window is not None:
+                try:
+                    self.switch_to.window(self._settings_window)
+                except NoSuchWindowException:
+                    self._settings_window = None
+            if self._settings_window is None:
+                handles = set(super().window_handles)
+                self.execute_script('window.open()')
+                self._window_handles = None
+                self._settings_window = (set(super().window_handles) - handles).pop()
+                self.switch_to.window(self._settings_window)
+                self.get('chrome://settings/')
+            try:
+                yield
+            finally:
+                self.switch_to.window(window)
+                if path:
+                    self.switch_to_frame_path(path)
+
     def get_default_zoom(self):
-        """ EXPERIMENTAL - Get the current default zoom level. """
-        self.execute_script('window.open()')
-        with Window(self):
-            self.get('chrome://settings/')
-            result = self.execute_async_script(
-                '''var callback = arguments[arguments.length - 1];
+        """ EXPERIMENTAL - Get the current default zoom level. The level is cached until it is set again. """
+        if self._default_zoom is None:
+            with self._settings():
+                result = self.execute_async_script(
+                    '''var callback = arguments[arguments.length - 1];
             chrome.settingsPrivate.getDefaultZoom(function(e) {
                 callback(e)
             })
             '''
-            )
-            self.close()
-            return float(result)
+                )
+            self._default_zoom = float(result)
+        return self._default_zoom
 
     def set_default_zoom(self, percent):
         """ EXPERIMENTAL - Set the current default zoom level. """
-        self.execute_script('window.open()')
-        with Window(self):
-            self.get('chrome://settings/')
+        self._default_zoom = None
+        with self._settings():
             self.execute_script(f'chrome.settingsPrivate.setDefaultZoom({percent / 100});')
-            self.close()
 
     def reset_default_zoom(self):
         """ EXPERIMENTAL - Resets the default zoom level. """
@@ -67,6 +232,12 @@ class OnlineContextManager:
 
     def _go_online(self):
         self.browser.set_network_conditions(offline=False, latency=0, throughput=0)
+        self.browser.mark_dirty()
+        if self.browser.sync_network:
+            # Requests the page sends once it is back online are waited on directly instead of guessed with a pause.
+            self.browser.wait_for_network_idle()
+            self.browser.wait_stable()
+            return
 
         # Angular takes a very short amount of time (about 8 hundredths of a second) to report back as not ready after
         # setting the browser online if when there are pending HTTP requests. Adding a small pause allows Angular to
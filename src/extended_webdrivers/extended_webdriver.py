@@ -1,12 +1,21 @@
+import functools
 import logging
+import re
 import time
-from urllib.parse import urljoin
+from contextlib import contextmanager
+from urllib.parse import urljoin, urlsplit
 
-from selenium.common.exceptions import JavascriptException, TimeoutException
+from selenium.common.exceptions import JavascriptException, TimeoutException, WebDriverException
 from selenium.webdriver.remote.command import Command
-from selenium.webdriver.support.wait import WebDriverWait, POLL_FREQUENCY
+from selenium.webdriver.remote.webelement import WebElement, getAttribute_js, isDisplayed_js
+from selenium.webdriver.support.wait import POLL_FREQUENCY
 
+from .instrumentation import Instrumentation
 from .js import Js
+from .locators import FIND_ALL_SCRIPT, js_locator
+from .scheduler import PollScheduler, url_pattern
+from .scripts import ScriptRegistry
+from .session_state import SessionStateError, read_session_state, session_state_expiry, write_session_state
 
 LOGGER = logging.getLogger(__name__)
 
@@ -44,35 +53,662 @@ COMMANDS_NEEDING_RESYNC = [
     Command.GO_FORWARD
 ]
 
+# The most windows and frames whose framework detection is remembered at once.
+DETECTION_CACHE_SIZE = 100
+
+# Commands that load a new document in the current window.
+COMMANDS_NAVIGATING = [Command.GET, Command.REFRESH, Command.GO_BACK, Command.GO_FORWARD]
+
+# Commands that can open or close windows from the page, after which the window handles have to be fetched again.
+COMMANDS_CHANGING_WINDOWS = [
+    Command.CLICK_ELEMENT,
+    Command.SEND_KEYS_TO_ELEMENT,
+    Command.SEND_KEYS_TO_ACTIVE_ELEMENT,
+    Command.SUBMIT_ELEMENT,
+    Command.EXECUTE_SCRIPT,
+    Command.W3C_EXECUTE_SCRIPT,
+    Command.EXECUTE_ASYNC_SCRIPT,
+    Command.W3C_EXECUTE_SCRIPT_ASYNC,
+    Command.W3C_ACTIONS,
+    Command.CLICK,
+    Command.DOUBLE_CLICK,
+    Command.MOUSE_UP,
+    Command.ACCEPT_ALERT,
+    Command.W3C_ACCEPT_ALERT,
+    Command.GET,
+    Command.REFRESH,
+    Command.GO_BACK,
+    Command.GO_FORWARD,
+    Command.SWITCH_TO_CONTEXT,
+    Command.QUIT,
+]
+
+# How a command interacts with the stable epoch. Reads sync only when the page isn't known to be stable, interactions
+# do the same and then mark the page as changed, and mutations mark the page as changed without syncing first.
+SYNC_READ = 'read'
+SYNC_INTERACT = 'interact'
+SYNC_MUTATE = 'mutate'
+
+SYNC_POLICIES = {command: SYNC_READ for command in COMMANDS_NEEDING_WAIT}
+SYNC_POLICIES.update(
+    {
+        command: SYNC_INTERACT
+        for command in [
+            Command.CLICK_ELEMENT,
+            Command.SEND_KEYS_TO_ELEMENT,
+            Command.SUBMIT_ELEMENT,
+            Command.CLEAR_ELEMENT,
+        ]
+    }
+)
+SYNC_POLICIES.update(
+    {
+        command: SYNC_MUTATE
+        for command in COMMANDS_NEEDING_RESYNC
+        + [
+            Command.CLOSE,
+            Command.EXECUTE_SCRIPT,
+            Command.W3C_EXECUTE_SCRIPT,
+            Command.EXECUTE_ASYNC_SCRIPT,
+            Command.W3C_EXECUTE_SCRIPT_ASYNC,
+            Command.SEND_KEYS_TO_ACTIVE_ELEMENT,
+            Command.W3C_ACTIONS,
+            Command.CLICK,
+            Command.DOUBLE_CLICK,
+            Command.MOUSE_DOWN,
+            Command.MOUSE_UP,
+            Command.MOVE_TO,
+            Command.ACCEPT_ALERT,
+            Command.W3C_ACCEPT_ALERT,
+            Command.DISMISS_ALERT,
+            Command.W3C_DISMISS_ALERT,
+        ]
+    }
+)
+
+# W3C sessions read attributes and visibility by running selenium's atoms as scripts, which are reads all the same.
+READ_SCRIPTS = frozenset(f'return ({atom}).apply(null, arguments);' for atom in (getAttribute_js, isDisplayed_js))
+
+ANGULAR_WAIT_SCRIPT = '''var cb = arguments[arguments.length - 1];
+Promise.all(window.getAllAngularTestabilities().map(t => {
+    return new Promise(resolve => {
+        return t.whenStable(resolve);
+    })
+})).then(cb);'''
+
+DETECTION_SCRIPT = '''var known = arguments[0];
+var documentId = window.__extendedWebdriverDocument;
+if (documentId && known.indexOf(documentId) >= 0) {
+    return {document: documentId};
+}
+if (!documentId) {
+    documentId = Date.now().toString(36) + Math.random().toString(36).slice(2);
+    window.__extendedWebdriverDocument = documentId;
+}
+return {
+    document: documentId,
+    angular: window.getAllAngularRootElements != undefined,
+    jquery: window.jQuery != undefined
+};'''
+
+STABILITY_SCRIPT = '''var status = {
+    document: document.readyState == 'complete',
+    jquery: null,
+    angular: null,
+    id: window.__extendedWebdriverDocument
+};
+if (!status.id) {
+    status.id = Date.now().toString(36) + Math.random().toString(36).slice(2);
+    window.__extendedWebdriverDocument = status.id;
+}
+if (window.jQuery != undefined) {
+    status.jquery = window.jQuery.active == 0;
+}
+if (window.getAllAngularRootElements != undefined) {
+    try {
+        status.angular = window.getAllAngularTestabilities().every((t) => t.isStable());
+    } catch (e) {
+        status.angular = true;
+    }
+}
+return status;'''
+
+# Seconds left between the end of a wait inside the page and the script timeout, so the page always ends the wait
+# itself and stops its timers, instead of leaving them running after the driver gave up.
+IN_PAGE_WAIT_MARGIN = 1
+
+
+def in_page_wait_margin(timeout: float) -> float:
+    """ Returns the margin for a timeout, IN_PAGE_WAIT_MARGIN or a tenth of short timeouts. """
+    return min(IN_PAGE_WAIT_MARGIN, 0.1 * timeout)
+
+
+STABLE_WAIT_SCRIPT = '''var syncDocument = arguments[0];
+var syncJquery = arguments[1];
+var syncAngular = arguments[2];
+var timeout = arguments[3] * 1000;
+var callback = arguments[arguments.length - 1];
+var done = false;
+var interval = null;
+var timer = null;
+var watchingJquery = false;
+var watchingAngular = false;
+
+function finish(settled) {
+    done = true;
+    clearInterval(interval);
+    clearTimeout(timer);
+    document.removeEventListener('readystatechange', check);
+    callback(settled);
+}
+
+function check() {
+    if (done) {
+        return;
+    }
+    if (syncDocument && document.readyState != 'complete') {
+        return;
+    }
+    if (syncJquery && window.jQuery != undefined && window.jQuery.active != 0) {
+        if (!watchingJquery) {
+            watchingJquery = true;
+            window.jQuery(document).one('ajaxStop', () => { watchingJquery = false; check(); });
+        }
+        return;
+    }
+    if (syncAngular && window.getAllAngularRootElements != undefined) {
+        try {
+            var testabilities = window.getAllAngularTestabilities();
+            if (!testabilities.every((t) => t.isStable())) {
+                if (!watchingAngular) {
+                    watchingAngular = true;
+                    Promise.all(testabilities.map((t) => new Promise((resolve) => t.whenStable(resolve)))).then(() => {
+                        watchingAngular = false;
+                        check();
+                    });
+                }
+                return;
+            }
+        } catch (e) {}
+    }
+    finish(true);
+}
+
+document.addEventListener('readystatechange', check);
+interval = setInterval(check, 25);
+timer = setTimeout(() => finish(false), timeout);
+check();'''
+
+
+ELEMENT_CONDITIONS = ('present', 'visible', 'gone', 'text')
+
+ELEMENT_WAIT_SCRIPT = (
+    FIND_ALL_SCRIPT
+    + '''var targets = arguments[0];
+var condition = arguments[1];
+var text = arguments[2];
+var timeout = arguments[3] * 1000;
+var callback = arguments[arguments.length - 1];
+var pattern = text && text.regex ? new RegExp(text.value, text.flags) : null;
+var done = false;
+
+function isVisible(element) {
+    if (!element.getClientRects().length) {
+        return false;
+    }
+    var style = window.getComputedStyle(element);
+    return style.visibility != 'hidden' && style.visibility != 'collapse' && style.opacity != '0';
+}
+
+function matches(element) {
+    if (condition == 'visible' || condition == 'gone') {
+        return isVisible(element);
+    }
+    if (condition == 'text') {
+        var content = element.innerText || element.textContent || '';
+        return pattern ? pattern.test(content) : content.indexOf(text.value) >= 0;
+    }
+    return true;
+}
+
+function evaluate() {
+    var found = [];
+    for (var i = 0; i < targets.length; i++) {
+        var matching = findAll(targets[i]).filter(matches);
+        if (condition == 'gone' ? matching.length : !matching.length) {
+            return null;
+        }
+        found.push(matching);
+    }
+    return found;
+}
+
+function finish(result) {
+    done = true;
+    observer.disconnect();
+    clearInterval(interval);
+    clearTimeout(timer);
+    callback(result);
+}
+
+function check() {
+    if (done) {
+        return;
+    }
+    try {
+        var found = evaluate();
+    } catch (e) {
+        finish({error: String(e.message || e)});
+        return;
+    }
+    if (found) {
+        finish({found: found});
+    }
+}
+
+var observer = new MutationObserver(check);
+observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+// Style sheets, animations and layout can change visibility without a mutation.
+var interval = setInterval(check, 100);
+var timer = setTimeout(() => finish({timedOut: true}), timeout);
+check();'''
+)
+
+FIND_LOCATORS_SCRIPT = (
+    FIND_ALL_SCRIPT
+    + '''var locators = arguments[0];
+var root = arguments[1];
+var found = {};
+locators.forEach((entry) => {
+    try {
+        var elements = findAll(entry.locator, root);
+    } catch (e) {
+        throw new Error(entry.name + ': ' + (e.message || e));
+    }
+    found[entry.name] = entry.many ? elements : elements.length ? elements[0] : null;
+});
+return found;'''
+)
+
+CAPTURE_SCRIPT = '''var capture = {
+    url: location.href,
+    title: document.title,
+    source: document.documentElement ? document.documentElement.outerHTML : '',
+    localStorage: {},
+    sessionStorage: {},
+    console: window.__extendedWebdriverConsole ? window.__extendedWebdriverConsole.entries : null
+};
+if (document.doctype) {
+    capture.source = new XMLSerializer().serializeToString(document.doctype) + '\\n' + capture.source;
+}
+['localStorage', 'sessionStorage'].forEach((name) => {
+    try {
+        var storage = window[name];
+        for (var i = 0; i < storage.length; i++) {
+            capture[name][storage.key(i)] = storage.getItem(storage.key(i));
+        }
+    } catch (e) {}
+});
+return capture;'''
+
+
+class Stability:
+    """ The state of the document, jQuery and Angular as reported by a single probe of the page. """
+
+    def __init__(self, document=True, jquery=None, angular=None):
+        self.document = document
+        self.jquery = jquery  # None when jQuery isn't on the page.
+        self.angular = angular  # None when Angular isn't on the page.
+
+    @property
+    def ready(self) -> bool:
+        """ Returns if the document is loaded and neither jQuery nor Angular are busy. """
+        return bool(self.document) and self.jquery is not False and self.angular is not False
+
+    def __repr__(self):
+        return f'Stability(document={self.document}, jquery={self.jquery}, angular={self.angular})'
+
+
+class FoundElements(dict):
+    """ The elements found by find_all by name. The names that matched nothing are listed in missing. """
+
+    def __init__(self, found: dict, missing: list):
+        super().__init__(found)
+        self.missing = missing
+
+
+def _read_only(method):
+    """ Decorator for methods that only inspect the page, so the scripts they run don't mark it as changed. """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.read_only():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def _instrumented(kind):
+    """ Decorator that records the method as a wait of the given kind when instrumentation is enabled. """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.instrumentation.enabled:
+                return method(self, *args, **kwargs)
+            with self.instrumentation.wait(kind):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
 
 class ExtendedWebdriver:
     """ Mixin class that extends a webdriver instance with additional methods. """
 
-    def __init__(self, base_url=None, sync_angular=True, sync_jquery=True, sync_document=True, *args, **kwargs):
+    def __init__(
+        self,
+        base_url=None,
+        sync_angular=True,
+        sync_jquery=True,
+        sync_document=True,
+        sync_in_browser=False,
+        stable_freshness=None,
+        instrumentation=None,
+        poll_scheduler=None,
+        *args,
+        **kwargs,
+    ):
+        # Stability tracking is consulted by execute, which the base class already uses while starting the session.
+        self.sync_policies = dict(SYNC_POLICIES)
+        self.stable_freshness = stable_freshness
+        self._epoch = 0
+        self._stable_epoch = None
+        self._stable_at = 0.0
+        self._read_only_depth = 0
+        self._unsynced_depth = 0
+        self._window_hop_depth = 0
+        self.instrumentation = instrumentation or Instrumentation()
+        self.poll_scheduler = poll_scheduler or PollScheduler()
+        # The URL last navigated to with get, which waits learn their settle times under.
+        self._url = None
+        # Framework detection results keyed by (window handle, frame path, document id).
+        self._detection_cache = {}
+        # Nothing is loaded yet, so detection waits for the first command that syncs or asks for it.
+        self._detection_pending = True
+        self._angular = False
+        self._jquery = False
+        self._window_handle = None
+        self._window_handles = None
+        self._frame_stack = []
+        self._document_id = None
+        # Counts the commands that could have replaced the current document, for helpers installed into it.
+        self._context_changes = 0
         super().__init__(*args, **kwargs)
+        self.scripts = ScriptRegistry(self)
         self.js = Js(self)
         self.base_url = base_url
         self.sync_angular = sync_angular
         self.sync_jquery = sync_jquery
         self.sync_document = sync_document
+        self.sync_in_browser = sync_in_browser
         self._script_timeout = 30  # I believe this is the default timeout.
-        self.angular = self._test_angular()
-        self.jquery = self._test_jquery()
 
     def execute(self, driver_command, params=None):
-        if driver_command in COMMANDS_NEEDING_WAIT:
-            if self.sync_angular:
-                self.wait_for_angular()
-            if self.sync_jquery:
-                self.wait_for_jquery(self._script_timeout)
-            if self.sync_document:
-                self.wait_for_document(self._script_timeout)
-            return super().execute(driver_command, params=params)
-        result = super().execute(driver_command, params=params)
+        policy = self.sync_policies.get(driver_command)
+        if driver_command == Command.W3C_EXECUTE_SCRIPT and params and params.get('script') in READ_SCRIPTS:
+            policy = SYNC_READ
+        if policy in (SYNC_READ, SYNC_INTERACT):
+            self._ensure_stable(driver_command)
+            result = self._send(driver_command, params)
+            if policy == SYNC_INTERACT:
+                self.mark_dirty()
+            return result
+        result = self._send(driver_command, params)
+        if policy == SYNC_MUTATE and (not self._read_only_depth or driver_command in COMMANDS_NEEDING_RESYNC):
+            self.mark_dirty()
+        self._track_context(driver_command, params)
         if driver_command in COMMANDS_NEEDING_RESYNC:
+            self._context_changes += 1
+            # Detection is deferred until a sync or a caller needs to know about Angular or jQuery, so switching
+            # windows and frames only to leave them again costs nothing extra.
+            self._detection_pending = True
+        if driver_command in COMMANDS_NAVIGATING and self.js.console.buffer_size:
+            try:
+                self.js.console.install()
+            except WebDriverException:
+                # Documents that can't run scripts, e.g. behind an alert or not HTML, are left without the buffer.
+                LOGGER.debug('Failed to install the console buffer after navigation.', exc_info=True)
+        return result
+
+    def _ensure_stable(self, driver_command=None):
+        """ Syncs unless the page is known to be stable or syncing is suspended. """
+        if self._unsynced_depth or self.known_stable:
+            return
+        if self.instrumentation.enabled:
+            with self.instrumentation.wait('sync', driver_command):
+                self._sync()
+        else:
+            self._sync()
+
+    @property
+    def angular(self) -> bool:
+        """ Returns if Angular was detected on the current document. """
+        if self._detection_pending:
+            self._detect_frameworks()
+        return self._angular
+
+    @angular.setter
+    def angular(self, value):
+        self._angular = value
+
+    @property
+    def jquery(self) -> bool:
+        """ Returns if jQuery was detected on the current document. """
+        if self._detection_pending:
+            self._detect_frameworks()
+        return self._jquery
+
+    @jquery.setter
+    def jquery(self, value):
+        self._jquery = value
+
+    @property
+    def current_window_handle(self):
+        """ Returns the handle of the current window. Inside a window hop the handle of the last switch is reused. """
+        if self._window_hop_depth and self._window_handle is not None:
+            return self._window_handle
+        self._window_handle = super().current_window_handle
+        return self._window_handle
+
+    @property
+    def window_handles(self):
+        """
+        Returns the handles of all windows. Inside a window hop they are kept in a registry until a command could have
+        opened or closed one, everywhere else they are read from the browser, which also sees the page opening windows.
+        """
+        if not self._window_hop_depth or self._window_handles is None:
+            self._window_handles = super().window_handles
+        return list(self._window_handles)
+
+    def _send(self, driver_command, params):
+        if not self.instrumentation.enabled:
+            return super().execute(driver_command, params=params)
+        with self.instrumentation.command(driver_command):
+            return super().execute(driver_command, params=params)
+
+    def _track_context(self, driver_command, params):
+        """ Follows the current window, the open windows and the frame from the commands that change them. """
+        if driver_command in COMMANDS_CHANGING_WINDOWS and not self._read_only_depth:
+            self._window_handles = None
+        if driver_command == Command.SWITCH_TO_WINDOW:
+            self._window_handle = params.get('handle', params.get('name'))
+            self._frame_stack = []
+        elif driver_command == Command.SWITCH_TO_FRAME:
+            if params.get('id') is None:
+                self._frame_stack = []
+            elif self._frame_stack is not None:
+                self._frame_stack.append(params['id'])
+        elif driver_command == Command.SWITCH_TO_PARENT_FRAME:
+            if self._frame_stack:
+                self._frame_stack.pop()
+        elif driver_command in COMMANDS_NAVIGATING:
+            self._frame_stack = []
+            if driver_command == Command.GET:
+                self._url = params.get('url')
+        elif driver_command == Command.SWITCH_TO_CONTEXT:
+            self._window_handle = None
+            self._frame_stack = None
+        elif driver_command == Command.CLOSE:
+            closed = self._window_handle
+            if closed is None or self._window_handles is None:
+                self._window_handles = None
+            elif closed in self._window_handles:
+                self._window_handles.remove(closed)
+            self._detection_cache = {key: value for key, value in self._detection_cache.items() if key[0] != closed}
+            self._window_handle = None
+
+    @property
+    def _frame_path(self):
+        if self._frame_stack is None:
+            return None
+        return tuple(getattr(frame, 'id', frame) for frame in self._frame_stack)
+
+    @_instrumented('detection')
+    @_read_only
+    def _detect_frameworks(self):
+        """
+        Detects Angular and jQuery on the current document. Documents are stamped with an id the first time they are
+        seen, so returning to a window or frame whose document hasn't been replaced reuses the cached result.
+        """
+        self._detection_pending = False
+        context = (self._window_handle, self._frame_path)
+        known = [key[2] for key in self._detection_cache if key[:2] == context]
+        try:
+            result = self.execute_script(DETECTION_SCRIPT, known)
+        except JavascriptException:
+            result = None
+        if not result:
+            self._document_id = None
             self.angular = self._test_angular()
             self.jquery = self._test_jquery()
-        return result
+            return
+        self._document_id = result['document']
+        key = context + (self._document_id,)
+        if 'angular' in result:
+            self._cache_detection(key, (result['angular'], result['jquery']))
+        self.angular, self.jquery = self._detection_cache[key]
+
+    def _cache_detection(self, key, detected) -> None:
+        """
+        Remembers the detection result of a document. Only the latest document of each window and frame is kept, since
+        a replaced document never comes back, and the ones cached longest ago are dropped beyond DETECTION_CACHE_SIZE.
+        """
+        context = key[:2]
+        for stale in [cached for cached in self._detection_cache if cached[:2] == context]:
+            del self._detection_cache[stale]
+        self._detection_cache[key] = detected
+        while len(self._detection_cache) > DETECTION_CACHE_SIZE:
+            del self._detection_cache[next(iter(self._detection_cache))]
+
+    @property
+    def known_stable(self) -> bool:
+        """ Returns if the page was confirmed stable and nothing has changed it since, within the freshness window. """
+        if self._stable_epoch != self._epoch:
+            return False
+        return self.stable_freshness is None or time.monotonic() - self._stable_at <= self.stable_freshness
+
+    def mark_dirty(self) -> None:
+        """ Starts a new stable epoch so the next command that needs a stable page syncs again. """
+        self._epoch += 1
+
+    def _mark_stable(self) -> None:
+        self._stable_epoch = self._epoch
+        self._stable_at = time.monotonic()
+
+    @contextmanager
+    def read_only(self):
+        """ Runs scripts inside the context without marking the page as changed. Navigation still marks it. """
+        self._read_only_depth += 1
+        try:
+            yield
+        finally:
+            self._read_only_depth -= 1
+
+    @contextmanager
+    def unsynced(self):
+        """
+        Sends commands inside the context without syncing first, e.g. to inspect a page that never settles. Scripts
+        don't mark the page as changed either.
+        """
+        self._unsynced_depth += 1
+        try:
+            with self.read_only():
+                yield
+        finally:
+            self._unsynced_depth -= 1
+
+    @contextmanager
+    def _window_hop(self):
+        """
+        Serves the window handles from the registry inside the context, for switching between windows and frames where
+        only the driver's own commands run. The registry is read fresh when the outermost hop starts.
+        """
+        if not self._window_hop_depth:
+            self._window_handles = None
+        self._window_hop_depth += 1
+        try:
+            yield
+        finally:
+            self._window_hop_depth -= 1
+
+    @contextmanager
+    def _preserve_sync_state(self):
+        """
+        Restores the stable epoch and framework detection when the context exits normally, for trips to another window
+        that leave the current document as it was.
+        """
+        saved = (
+            self._epoch,
+            self._stable_epoch,
+            self._stable_at,
+            self._detection_pending,
+            self._document_id,
+            self._angular,
+            self._jquery,
+            self._url,
+        )
+        yield
+        (
+            self._epoch,
+            self._stable_epoch,
+            self._stable_at,
+            self._detection_pending,
+            self._document_id,
+            self._angular,
+            self._jquery,
+            self._url,
+        ) = saved
+
+    @_read_only
+    def _sync(self):
+        """ Probes the page once and only waits on the parts that are reported as busy. """
+        if not (self.sync_angular or self.sync_jquery or self.sync_document):
+            self._mark_stable()
+            return
+        stability = self.get_stability()
+        if self.sync_in_browser:
+            if not stability.ready:
+                self.wait_in_browser(self.sync_document, self.sync_jquery, self.sync_angular)
+        else:
+            if self.sync_angular and stability.angular is False:
+                self.wait_for_angular()
+            if self.sync_jquery and stability.jquery is False:
+                self.wait_for_jquery()
+            if self.sync_document and not stability.document:
+                self.wait_for_document()
+        self._mark_stable()
 
     def get(self, url):
         if (self.base_url and self.base_url in url) or not self.base_url:
@@ -84,12 +720,15 @@ class ExtendedWebdriver:
         super().set_script_timeout(time_to_wait)
         self._script_timeout = time_to_wait
 
+    @_instrumented('detection')
+    @_read_only
     def _test_angular(self):
         try:
             return self.execute_script('return window.getAllAngularRootElements != undefined;')
         except JavascriptException:
             return False
 
+    @_read_only
     def is_angular_ready(self):
         if not self.angular:
             return True
@@ -100,24 +739,23 @@ class ExtendedWebdriver:
             self._test_angular()
             return True
 
+    @_instrumented('angular')
+    @_read_only
     def wait_for_angular(self):
         if self.angular:
-            script = '''var cb = arguments[arguments.length - 1];
-Promise.all(window.getAllAngularTestabilities().map(t => { 
-    return new Promise(resolve => {
-        return t.whenStable(resolve);
-    })
-})).then(cb);'''
             try:
-                self.execute_async_script(script)
+                self.scripts.call_async('angular.whenStable', ANGULAR_WAIT_SCRIPT)
             except JavascriptException:
                 self._test_angular()
             except TimeoutException as e:
                 raise Exception(f'Angular not stable after {self._script_timeout} seconds.') from e
 
+    @_instrumented('detection')
+    @_read_only
     def _test_jquery(self):
         return self.execute_script('return window.jQuery != undefined;')
 
+    @_read_only
     def is_jquery_ready(self):
         if not self.jquery:
             return True
@@ -127,49 +765,397 @@ Promise.all(window.getAllAngularTestabilities().map(t => {
             self._test_jquery()
             return True
 
-    def wait_for_jquery(self, timeout):
+    @_instrumented('jquery')
+    @_read_only
+    def wait_for_jquery(self, timeout: (None, float) = None):
         if self.jquery:
+            if self.sync_in_browser:
+                self.wait_in_browser(document=False, jquery=True, angular=False, timeout=timeout)
+                return
+            if timeout is None:
+                timeout = self._script_timeout
             try:
-                WebDriverWait(self, timeout).until(lambda d: d.execute_script('return jQuery.active == 0;'))
+                self._poll(
+                    'jquery', lambda: self.execute_script('return jQuery.active == 0;'), timeout, 'jQuery is active.'
+                )
             except JavascriptException:
                 self._test_jquery()
 
+    @_read_only
     def is_document_ready(self):
         return self.execute_script("return document.readyState == 'complete'")
 
-    def wait_for_document(self, timeout):
-        WebDriverWait(self, timeout).until(lambda d: d.execute_script("return document.readyState == 'complete';"))
+    @_instrumented('document')
+    @_read_only
+    def wait_for_document(self, timeout: (None, float) = None):
+        if self.sync_in_browser:
+            self.wait_in_browser(document=True, jquery=False, angular=False, timeout=timeout)
+            return
+        if timeout is None:
+            timeout = self._script_timeout
+        self._poll(
+            'document',
+            lambda: self.execute_script("return document.readyState == 'complete';"),
+            timeout,
+            'The document is not ready.',
+        )
+
+    def _poll(self, kind: str, condition, timeout: float, message: str, **kwargs):
+        """ Polls the condition with the poll scheduler, learning settle times per kind of wait and URL pattern. """
+        key = (kind, url_pattern(self._url))
+        return self.poll_scheduler.wait(condition, timeout, key=key, message=message, **kwargs)
+
+    @_instrumented('in_browser')
+    @_read_only
+    def wait_in_browser(
+        self, document: bool = True, jquery: bool = True, angular: bool = True, timeout: (None, int) = None
+    ) -> None:
+        """
+        Waits for the page to settle with a single asynchronous script that watches the document ready state, jQuery
+        ajax activity and Angular testabilities inside the page and returns as soon as all of them are idle.
+
+        :param document: Wait for the document ready state to be complete. (Default: True)
+        :param jquery: Wait for jQuery to have no active requests. (Default: True)
+        :param angular: Wait for Angular testabilities to be stable. (Default: True)
+        :param timeout: The amount of time in seconds to wait. The default time is determined by the current script
+                        timeout.
+        :raises TimeoutException: If the page didn't settle in time.
+        """
+
+        with self._in_page_wait(timeout) as timeout:
+            settled = self.execute_async_script(STABLE_WAIT_SCRIPT, document, jquery, angular, timeout)
+        if not settled:
+            raise TimeoutException(f'Page not stable after {timeout} seconds.')
+
+    @contextmanager
+    def _in_page_wait(self, timeout: (None, float)):
+        """
+        Yields how long in seconds a wait inside the page may take, by default until just before the script timeout.
+        The script timeout is raised for the duration when it would end the wait before the page does.
+        """
+        if timeout is None:
+            timeout = self._script_timeout - in_page_wait_margin(self._script_timeout)
+        script_timeout = timeout + in_page_wait_margin(timeout)
+        if script_timeout <= self._script_timeout:
+            script_timeout = None
+        with self._temporary_script_timeout(script_timeout):
+            yield timeout
 
+    @contextmanager
+    def _temporary_script_timeout(self, timeout: (None, int)):
+        """ Sets the script timeout for the duration of the context, unless it is None or already set. """
+        restore_timeout = timeout is not None and timeout != self._script_timeout
+        if restore_timeout:
+            script_timeout = self._script_timeout
+            self.set_script_timeout(timeout)
+        try:
+            yield
+        finally:
+            if restore_timeout:
+                self.set_script_timeout(script_timeout)
+
+    @_instrumented('probe')
+    @_read_only
+    def get_stability(self) -> Stability:
+        """ Checks the document ready state, jQuery and Angular testabilities in one round trip. """
+        status = self.execute_script(STABILITY_SCRIPT) or {}
+        stability = Stability(status.get('document', True), status.get('jquery'), status.get('angular'))
+        self.angular = stability.angular is not None
+        self.jquery = stability.jquery is not None
+        self._detection_pending = False
+        self._document_id = status.get('id')
+        key = (self._window_handle, self._frame_path, self._document_id)
+        if self._document_id is not None:
+            self._cache_detection(key, (self.angular, self.jquery))
+        if stability.ready:
+            self._mark_stable()
+        return stability
+
+    @_read_only
     def is_stable(self) -> bool:
-        return self.is_document_ready() and self.is_jquery_ready() and self.is_angular_ready()
+        return self.get_stability().ready
 
+    @_read_only
     def wait_for_stable(
-        self, pause: float = 0.0, poll_frequency: float = POLL_FREQUENCY, timeout: (None, int) = None
+        self,
+        pause: float = 0.0,
+        poll_frequency: float = POLL_FREQUENCY,
+        timeout: (None, int) = None,
+        in_browser: (None, bool) = None,
     ) -> None:
         """
         Goes through a series of checks to verify the the web page is ready for use. Selenium does a majority of these
         checks but this additionally checks the status of the document ready state, jQuery and Angular testabilities.
 
-        :param pause: The amount of time in seconds to pause code execution before checking the web page. (Default: 0.0)
-        :param poll_frequency: How often in seconds to check the state of the web page. (Default: 0.5)
+        :param pause: The amount of time in seconds the web page must stay ready before the wait ends. (Default: 0.0)
+        :param poll_frequency: The longest time in seconds between checks of the web page. Checks start faster and
+                               back off, see PollScheduler. (Default: 0.5)
         :param timeout: The amount of time in seconds to wait for the browser to report back as ready. The default time
                         is determined by the current script timeout.
+        :param in_browser: Wait inside the page with a single asynchronous script instead of polling from Python. The
+                           default is determined by sync_in_browser.
         """
 
+        if in_browser is None:
+            in_browser = self.sync_in_browser
+        if in_browser:
+            # Only a timeout the caller chose is forwarded, the default one fits in the script timeout as it is.
+            self.wait_in_browser(timeout=timeout)
+            if not pause:
+                self._mark_stable()
+                return
+            # Settled in the page, now make sure it stays that way.
         if timeout is None:
             timeout = self._script_timeout
-        time.sleep(pause)
-        WebDriverWait(self, timeout, poll_frequency).until(
-            lambda d: d.is_angular_ready() and d.is_jquery_ready() and d.is_document_ready()
+        self._poll(
+            'stable',
+            lambda: self.get_stability().ready,
+            timeout,
+            'The page did not become stable.',
+            max_interval=poll_frequency,
+            quiet=pause,
         )
 
     wait_stable = wait_for_stable
 
+    def is_open(self):
+        try:
+            return self.current_url is not None
+        except WebDriverException:
+            return False
+
+    def reset_state(self, blank_page: bool = True) -> None:
+        """
+        Brings the session back to a clean state for reuse: closes every window but the first, deletes cookies and
+        clears localStorage, sessionStorage and IndexedDB. Storage and cookies can only be cleared for the origin that
+        is loaded when this is called.
+
+        :param blank_page: Navigate to about:blank afterwards so the next user starts from an empty page.
+        """
+        handles = self.window_handles
+        for handle in handles[1:]:
+            self.switch_to.window(handle)
+            self.close()
+        if len(handles) > 1:
+            self.switch_to.window(handles[0])
+        self.delete_all_cookies()
+        try:
+            self.js.window.clear()
+        except WebDriverException:
+            # Pages such as about:blank have no storage to clear.
+            pass
+        if blank_page:
+            self.get('about:blank')
+        self._detection_cache.clear()
+        self.mark_dirty()
+
+    def save_session_state(self, path, databases: list = (), max_age: (None, float) = None) -> dict:
+        """
+        Saves the cookies, localStorage, sessionStorage and IndexedDB databases of the current origin to a gzipped JSON
+        file, so later sessions can start from the same state with load_session_state, e.g. logged in without going
+        through the login page. Takes three round trips.
+
+        :param path: File to write.
+        :param databases: Names of the IndexedDB databases to include.
+        :param max_age: Seconds the state stays valid. It also expires with the first persistent cookie that does.
+        :raises SessionStateError: If one of the databases couldn't be read.
+        """
+        url = self.current_url
+        cookies = self.get_cookies()
+        storage = self.js.window.get_state(databases)
+        if storage['failed']:
+            raise SessionStateError(f'Could not read IndexedDB databases: {", ".join(storage["failed"])}')
+        parts = urlsplit(url)
+        created = time.time()
+        state = {
+            'created': created,
+            'expires': session_state_expiry(cookies, created, max_age),
+            'origin': f'{parts.scheme}://{parts.netloc}',
+            'url': url,
+            'cookies': cookies,
+            'local_storage': storage['localStorage'],
+            'session_storage': storage['sessionStorage'],
+            'indexed_db': storage['indexedDB'],
+        }
+        write_session_state(path, state)
+        return state
+
+    def load_session_state(self, path, url: (None, str) = None, landing_url: (None, str) = None) -> dict:
+        """
+        Restores a state saved with save_session_state: opens a page on the saved origin, adds the cookies, replaces
+        web storage and the saved IndexedDB databases with one script and opens the target page. Takes three round trips
+        plus one per cookie.
+
+        :param path: File written by save_session_state.
+        :param url: Page to open once the state is restored. (Default: the page the state was saved on)
+        :param landing_url: Page on the saved origin to restore the state on. A light page that doesn't open the app's
+                            databases, such as a static file, saves waiting for the app to release them. (Default: the
+                            root of the origin)
+        :raises SessionStateError: If the file is missing, unreadable or expired, or the state couldn't be restored.
+        """
+        state = read_session_state(path)
+        self.get(landing_url or state['origin'] + '/')
+        now = time.time()
+        for cookie in state['cookies']:
+            if cookie.get('expiry') is None or cookie['expiry'] > now:
+                self.add_cookie(cookie)
+        try:
+            failed = self.js.window.set_state(
+                {
+                    'localStorage': state['local_storage'],
+                    'sessionStorage': state['session_storage'],
+                    'indexedDB': state['indexed_db'],
+                }
+            )
+        except TimeoutException as e:
+            raise SessionStateError('Timed out restoring the state.') from e
+        if failed:
+            raise SessionStateError(f'Could not restore: {", ".join(failed)}')
+        self.get(url or state['url'])
+        return state
+
+    def find_all(self, locators: dict, root: (None, WebElement) = None) -> FoundElements:
+        """
+        Finds the elements of many locators with one script, after a single sync, and returns them by name. A locator
+        wrapped in a list finds every match instead of the first. Names that matched nothing are None, or an empty
+        list, and are listed in the result's missing attribute.
+
+        elements = browser.find_all({'search': (By.ID, 'search'), 'rows': ['table tr'], 'next': (By.LINK_TEXT, 'Next')})
+        elements['rows'], elements.missing
+
+        :param locators: Names mapped to (by, value) tuples as used by find_element, or CSS selectors.
+        :param root: Only search inside this element.
+        """
+        entries = []
+        for name, locator in locators.items():
+            many = isinstance(locator, list)
+            if many:
+                if len(locator) != 1:
+                    raise ValueError(f'{name}: a list must hold exactly one locator, got {len(locator)}.')
+                (locator,) = locator
+            entries.append({'name': name, 'locator': js_locator(locator), 'many': many})
+        self._ensure_stable()
+        with self.read_only():
+            found = self.execute_script(FIND_LOCATORS_SCRIPT, entries, root)
+        missing = [name for name in locators if not found.get(name)]
+        return FoundElements({name: found.get(name) for name in locators}, missing)
+
+    @_instrumented('elements')
+    @_read_only
+    def wait_for_elements(
+        self, *locators, condition: str = 'present', text=None, timeout: (None, float) = None
+    ) -> list:
+        """
+        Waits inside the page until every locator matches elements in the condition and returns the matching elements
+        of each locator. A MutationObserver checks the page whenever it changes, so the wait takes one round trip and
+        returns as soon as the condition holds.
+
+        button, rows = browser.wait_for_elements((By.ID, 'save'), 'table tr', condition='visible')
+
+        :param locators: (by, value) tuples as used by find_element, or CSS selectors.
+        :param condition: 'present', 'visible', 'gone' for no visible matches or 'text' for matches containing text.
+                          (Default: 'present')
+        :param text: The text to look for with the 'text' condition, or a compiled regular expression to search with.
+        :param timeout: The amount of time in seconds to wait. The default time is determined by the current script
+                        timeout.
+        :raises TimeoutException: If the condition doesn't hold in time.
+        """
+        if condition not in ELEMENT_CONDITIONS:
+            raise ValueError(f'Unknown condition: {condition}')
+        if (condition == 'text') != (text is not None):
+            raise ValueError('text is required with, and only with, the text condition.')
+        targets = [js_locator(locator) for locator in locators]
+        if isinstance(text, re.Pattern):
+            flags = ''.join(flag for bit, flag in ((re.I, 'i'), (re.M, 'm'), (re.S, 's')) if text.flags & bit)
+            text = {'value': text.pattern, 'flags': flags, 'regex': True}
+        elif text is not None:
+            text = {'value': str(text), 'regex': False}
+        with self._in_page_wait(timeout) as timeout:
+            result = self.execute_async_script(ELEMENT_WAIT_SCRIPT, targets, condition, text, timeout)
+        if 'error' in result:
+            raise JavascriptException(result['error'])
+        if 'timedOut' in result:
+            raise TimeoutException(f'{", ".join(map(str, locators))} not {condition} after {timeout} seconds.')
+        return result['found']
+
+    def wait_for_element(self, locator, condition: str = 'present', text=None, timeout: (None, float) = None):
+        """ Waits for a single locator like wait_for_elements and returns its first match, or None if it is gone. """
+        found = self.wait_for_elements(locator, condition=condition, text=text, timeout=timeout)[0]
+        return found[0] if found else None
+
+    def capture_artifacts(self, screenshot: bool = True, logs: bool = True) -> dict:
+        """
+        Captures what is needed to debug a failure without waiting for the page to settle: a screenshot, the page
+        source, url, title, cookies, localStorage, sessionStorage, the console buffer if js.console is capturing and
+        the browser log where the driver supports it.
+        Takes three round trips, or four with logs. Parts that can't be captured are reported in 'errors' instead of
+        raising, so a broken page still yields the rest. Hand the result to an ArtifactWriter to save it.
+
+        :param screenshot: Capture a screenshot, as base64 encoded PNG.
+        :param logs: Capture the browser log.
+        """
+        artifacts = {'captured_at': time.time(), 'errors': {}}
+        parts = [('page', lambda: artifacts.update(self.execute_script(CAPTURE_SCRIPT) or {}))]
+        if screenshot:
+            parts.insert(0, ('screenshot', lambda: artifacts.update(screenshot=self.get_screenshot_as_base64())))
+        parts.append(('cookies', lambda: artifacts.update(cookies=self.get_cookies())))
+        if logs:
+            parts.append(('logs', lambda: artifacts.update(logs=self.get_log('browser'))))
+        with self.unsynced():
+            for name, capture in parts:
+                try:
+                    capture()
+                except WebDriverException as e:
+                    artifacts['errors'][name] = e.msg or str(e)
+        return artifacts
+
+    @property
+    def frame_path(self) -> (None, tuple):
+        """
+        Returns the frames entered from the top of the current window, outermost first, as the references they were
+        switched to with. Returns None if the path is unknown, e.g. after switching context on a mobile driver.
+        """
+        if self._frame_stack is None:
+            return None
+        return tuple(self._frame_stack)
+
+    def switch_to_frame_path(self, path) -> None:
+        """
+        Switches to a frame path, as returned by frame_path, in as few hops as possible. Frames shared with the current
+        path are kept, the rest are left with parent_frame, or default_content when that is cheaper, and then entered.
+        """
+        path = list(path)
+        target = [getattr(frame, 'id', frame) for frame in path]
+        current = self._frame_path
+        if current is None:
+            self.switch_to.default_content()
+            current = ()
+        common = 0
+        while common < min(len(current), len(target)) and current[common] == target[common]:
+            common += 1
+        # Going up one frame at a time costs a hop per frame, starting from the top costs one plus re-entering.
+        if len(current) - common > 1 + common:
+            self.switch_to.default_content()
+            common = 0
+        else:
+            for _ in range(len(current) - common):
+                self.switch_to.parent_frame()
+        for frame in path[common:]:
+            self.switch_to.frame(frame)
+
     @property
+    @_read_only
     def frame(self):
+        """ Returns the element of the current frame, or None at the top of the window. """
+        if self._frame_stack is not None:
+            if not self._frame_stack:
+                return None
+            if isinstance(self._frame_stack[-1], WebElement):
+                return self._frame_stack[-1]
         return self.execute_script('return window.frameElement')
 
     @property
+    @_read_only
     def fullscreen(self) -> bool:
         """ Returns if the window is maximized. """
         script = 'return window.outerWidth == screen.availWidth && window.outerHeight == screen.availHeight'
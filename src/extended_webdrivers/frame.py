@@ -8,45 +8,34 @@ class Frame:
 
     def _switch_to(self):
         """ Switches to the specified frame. """
-        # Store the parent window and frame to access when we leave the child frame.
+        # Store the parent window and frame path to access when we leave the child frame.
         self.parent_window = self.browser.current_window_handle
+        self.parent_path = self.browser.frame_path
         self.parent_frame = self.browser.frame
 
-        # Switch to the child frame.
+        # Switch to the child frame. The browser syncs on the first command that interacts with it.
         self.browser.switch_to.frame(self.child_frame)
 
-        self.browser.angular = self.browser._test_angular()
-        self.browser.jquery = self.browser._test_jquery()
-
-        if self.browser.sync_angular:
-            self.browser.wait_for_angular()
-        if self.browser.sync_jquery:
-            self.browser.wait_for_jquery(self.browser._script_timeout)
-
     def __enter__(self):
-        self._switch_to()
+        with self.browser._window_hop():
+            self._switch_to()
         return self
 
     def _switch_from(self):
         """ Switches to the previous frame. """
-        # Switch to the default window and frame.
-        self.browser.switch_to.default_content()
-
-        # Switch to the parent window.
+        # Switch to the parent window, which starts at the top of the window.
         if self.browser.current_window_handle != self.parent_window:
             self.browser.switch_to.window(self.parent_window)
 
-        # Switch to parent frame if it exists.
-        if self.parent_frame is not None:
-            self.browser.switch_to.frame(self.parent_frame)
-
-        self.browser.angular = self.browser._test_angular()
-        self.browser.jquery = self.browser._test_jquery()
-
-        if self.browser.sync_angular:
-            self.browser.wait_for_angular()
-        if self.browser.sync_jquery:
-            self.browser.wait_for_jquery(self.browser._script_timeout)
+        if self.parent_path is not None:
+            # Walk back to the parent frame from wherever we are now, usually a single parent_frame hop.
+            self.browser.switch_to_frame_path(self.parent_path)
+        else:
+            # The frame path is unknown, so start from the top and re-enter the parent frame.
+            self.browser.switch_to.default_content()
+            if self.parent_frame is not None:
+                self.browser.switch_to.frame(self.parent_frame)
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self._switch_from()
+        with self.browser._window_hop():
+            self._switch_from()
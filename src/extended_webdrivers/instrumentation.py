@@ -0,0 +1,169 @@
+import bisect
+import json
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets in seconds. Anything slower lands in the overflow bucket.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """ Counts durations into fixed buckets and keeps their count, total, minimum and maximum. """
+
+    def __init__(self, buckets: bool = True):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(BUCKETS) + 1) if buckets else None
+
+    def add(self, duration: float) -> None:
+        self.count += 1
+        self.total += duration
+        if self.min is None or duration < self.min:
+            self.min = duration
+        if self.max is None or duration > self.max:
+            self.max = duration
+        if self.buckets is not None:
+            self.buckets[bisect.bisect_left(BUCKETS, duration)] += 1
+
+    def to_dict(self) -> dict:
+        result = {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+        }
+        if self.buckets is not None:
+            bounds = [str(bound) for bound in BUCKETS] + ['inf']
+            result['buckets'] = dict(zip(bounds, self.buckets))
+        return result
+
+
+class CommandStats:
+    """ Latency of a driver command and the time spent syncing before it. """
+
+    def __init__(self, buckets: bool = True):
+        self.latency = Histogram(buckets)
+        self.sync = Histogram(buckets)
+
+    def to_dict(self) -> dict:
+        return {'latency': self.latency.to_dict(), 'sync': self.sync.to_dict()}
+
+
+class WaitStats:
+    """ Time spent in one kind of wait and the number of commands it sent to the browser. """
+
+    def __init__(self, buckets: bool = True):
+        self.duration = Histogram(buckets)
+        self.polls = 0
+
+    def to_dict(self) -> dict:
+        return {'duration': self.duration.to_dict(), 'polls': self.polls}
+
+
+class Instrumentation:
+    """
+    Records how long each driver command takes and how much of it goes into the implicit sync. Waits are recorded by
+    kind: 'sync' for the whole implicit sync, 'probe', 'angular', 'jquery', 'document', 'in_browser' and 'network' for
+    its parts, 'detection' for framework detection after navigation and 'elements' for element waits. Commands sent
+    while a wait is running count as its polls instead of as commands.
+
+    Instrumentation is off by default and costs a single attribute check per command until it is enabled.
+
+    browser.instrumentation.enable()
+    ...
+    browser.instrumentation.export('timings.json')
+    """
+
+    def __init__(self, enabled: bool = False, histograms: bool = True):
+        """
+        :param enabled: Start recording immediately.
+        :param histograms: Keep bucketed histograms. Without them only counts, totals and extremes are recorded.
+        """
+        self.enabled = enabled
+        self.histograms = histograms
+        self.commands = {}
+        self.waits = {}
+        self._hooks = []
+        self._active_waits = []
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        self.commands = {}
+        self.waits = {}
+
+    def add_hook(self, hook) -> None:
+        """
+        Registers a callable that is called as hook(event, name, duration) after every recording. The event is
+        'command', 'sync' or 'wait'.
+        """
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook) -> None:
+        self._hooks.remove(hook)
+
+    def _notify(self, event, name, duration):
+        for hook in self._hooks:
+            hook(event, name, duration)
+
+    def _command_stats(self, command) -> CommandStats:
+        if command not in self.commands:
+            self.commands[command] = CommandStats(self.histograms)
+        return self.commands[command]
+
+    def _wait_stats(self, kind) -> WaitStats:
+        if kind not in self.waits:
+            self.waits[kind] = WaitStats(self.histograms)
+        return self.waits[kind]
+
+    @contextmanager
+    def command(self, command):
+        """ Times a command sent to the browser. Inside a wait it is counted as one of the wait's polls. """
+        if self._active_waits:
+            self._wait_stats(self._active_waits[-1]).polls += 1
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self._command_stats(command).latency.add(duration)
+            self._notify('command', command, duration)
+
+    @contextmanager
+    def wait(self, kind, command=None):
+        """ Times a wait. When command is given the time is also recorded as that command's sync overhead. """
+        self._active_waits.append(kind)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self._active_waits.pop()
+            self._wait_stats(kind).duration.add(duration)
+            if command is not None:
+                self._command_stats(command).sync.add(duration)
+                self._notify('sync', command, duration)
+            self._notify('wait', kind, duration)
+
+    def to_dict(self) -> dict:
+        return {
+            'commands': {command: stats.to_dict() for command, stats in self.commands.items()},
+            'waits': {kind: stats.to_dict() for kind, stats in self.waits.items()},
+        }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def export(self, path) -> None:
+        """ Writes the recorded statistics to a JSON file. """
+        with open(path, 'w') as f:
+            f.write(self.to_json(indent=2))
@@ -1,28 +1,591 @@
+from collections.abc import MutableMapping
+from contextlib import nullcontext
+
 from selenium.webdriver.remote.webelement import WebElement
 
+from .scripts import InlineScripts
+
+BULK_PROPERTIES_SCRIPT = '''var elements = arguments[0];
+if (typeof elements == 'string') {
+    elements = Array.from(document.querySelectorAll(elements));
+}
+var fields = arguments[1];
+var styles = elements.map(() => null);
+function style(index) {
+    if (styles[index] === null) {
+        styles[index] = window.getComputedStyle(elements[index]);
+    }
+    return styles[index];
+}
+var columns = {};
+fields.forEach(function (field) {
+    var separator = field.indexOf(':');
+    var kind = separator < 0 ? field : field.slice(0, separator);
+    var name = field.slice(separator + 1);
+    columns[field] = elements.map(function (element, index) {
+        switch (kind) {
+            case 'element':
+                return element;
+            case 'text':
+                return element.innerText !== undefined ? element.innerText : element.textContent;
+            case 'tag_name':
+                return element.tagName.toLowerCase();
+            case 'rect':
+                var rect = element.getBoundingClientRect();
+                return {x: rect.x, y: rect.y, width: rect.width, height: rect.height};
+            case 'displayed':
+                var box = element.offsetWidth || element.offsetHeight || element.getClientRects().length;
+                return !!box && style(index).visibility != 'hidden';
+            case 'attribute':
+                return element.getAttribute(name);
+            case 'property':
+                return element[name];
+            case 'style':
+                return style(index).getPropertyValue(name);
+        }
+    });
+});
+return columns;'''
+
+INDEXED_DB_GET_ALL_SCRIPT = '''var databaseName = arguments[0];
+var objectName = arguments[1];
+var callback = arguments[arguments.length - 1];
+
+var db_request = window.indexedDB.open(databaseName);
+
+db_request.onerror = function(event) {
+    callback(null);
+};
+
+db_request.onsuccess = function(event) {
+    var db = db_request.result;
+    var transaction = db.transaction(objectName);
+    var objectStore = transaction.objectStore(objectName);
+    var data_request = objectStore.getAll();
+
+    data_request.onerror = function(event) {
+        callback(null);
+    };
+
+    data_request.onsuccess = function(event) {
+        callback(data_request.result);
+    };
+};'''
+
+INDEXED_DB_DELETE_SCRIPT = '''var databaseName = arguments[0];
+var callback = arguments[arguments.length - 1];
+
+try {
+    var req = indexedDB.deleteDatabase(databaseName);
+}
+catch (DOMException) {
+    callback(false);
+}
+req.onsuccess = function () {
+    callback(true);
+};
+req.onerror = function () {
+    callback(false);
+};
+req.onblocked = function () {
+    callback(false);
+};'''
+
+INDEXED_DB_OPEN_SCRIPT = '''var databaseName = arguments[0];
+var objectName = arguments[1];
+var indexName = arguments[2];
+var range = arguments[3];
+var callback = arguments[arguments.length - 1];
+
+function makeRange(lower, upper, lowerOpen, upperOpen) {
+    if (lower === null && upper === null) return null;
+    if (upper === null) return IDBKeyRange.lowerBound(lower, lowerOpen);
+    if (lower === null) return IDBKeyRange.upperBound(upper, upperOpen);
+    return IDBKeyRange.bound(lower, upper, lowerOpen, upperOpen);
+}
+
+function openSource(onSource) {
+    var request = window.indexedDB.open(databaseName);
+    request.onerror = function () {
+        callback({error: 'Could not open database ' + databaseName});
+    };
+    request.onupgradeneeded = function () {
+        request.transaction.abort();
+    };
+    request.onsuccess = function () {
+        var db = request.result;
+        var done = function (result) {
+            db.close();
+            callback(result);
+        };
+        try {
+            var store = db.transaction(objectName, 'readonly').objectStore(objectName);
+            onSource(indexName === null ? store : store.index(indexName), done);
+        } catch (e) {
+            done({error: String(e)});
+        }
+    };
+}
+'''
+
+INDEXED_DB_COUNT_SCRIPT = (
+    INDEXED_DB_OPEN_SCRIPT
+    + '''
+openSource(function (source, done) {
+    var request = source.count(range && makeRange(range.lower, range.upper, range.lowerOpen, range.upperOpen));
+    request.onsuccess = function () { done({count: request.result}); };
+    request.onerror = function () { done({error: String(request.error)}); };
+});'''
+)
+
+INDEXED_DB_PAGE_SCRIPT = (
+    INDEXED_DB_OPEN_SCRIPT
+    + '''var after = arguments[4];
+var batchSize = arguments[5];
+var fields = arguments[6];
+
+function project(value) {
+    if (fields === null) return value;
+    var result = {};
+    fields.forEach(function (field) {
+        var current = value;
+        field.split('.').forEach(function (part) {
+            current = current === null || current === undefined ? undefined : current[part];
+        });
+        result[field] = current === undefined ? null : current;
+    });
+    return result;
+}
+
+openSource(function (source, done) {
+    var lower = range ? range.lower : null;
+    var lowerOpen = range ? range.lowerOpen : false;
+    var upper = range ? range.upper : null;
+    var upperOpen = range ? range.upperOpen : false;
+    if (after !== null) {
+        // Store cursors resume strictly after the last primary key. Index keys aren't unique, so index cursors
+        // resume at the last index key and seek past the last primary key with continuePrimaryKey.
+        lower = after.key;
+        lowerOpen = indexName === null;
+        if (upper !== null) {
+            var order = indexedDB.cmp(lower, upper);
+            if (order > 0 || (order == 0 && (lowerOpen || upperOpen))) {
+                done({values: [], last: null, done: true});
+                return;
+            }
+        }
+    }
+    var request = source.openCursor(makeRange(lower, upper, lowerOpen, upperOpen));
+    var values = [];
+    var last = null;
+    var seeking = after !== null && indexName !== null;
+    request.onerror = function () { done({error: String(request.error)}); };
+    request.onsuccess = function () {
+        var cursor = request.result;
+        if (!cursor) {
+            done({values: values, last: last, done: true});
+            return;
+        }
+        if (seeking && indexedDB.cmp(cursor.key, after.key) == 0) {
+            var order = indexedDB.cmp(cursor.primaryKey, after.primaryKey);
+            if (order < 0) {
+                cursor.continuePrimaryKey(after.key, after.primaryKey);
+                return;
+            }
+            seeking = false;
+            if (order == 0) {
+                cursor.continue();
+                return;
+            }
+        }
+        seeking = false;
+        values.push(project(cursor.value));
+        last = {key: cursor.key, primaryKey: cursor.primaryKey};
+        if (values.length >= batchSize) {
+            done({values: values, last: last, done: false});
+            return;
+        }
+        cursor.continue();
+    };
+});'''
+)
+
+STORAGE_SNAPSHOT_SCRIPT = '''var storage = window[arguments[0]];
+var items = {};
+for (var i = 0; i < storage.length; i++) {
+    var key = storage.key(i);
+    items[key] = storage.getItem(key);
+}
+return items;'''
+
+STORAGE_WRITE_SCRIPT = '''var storage = window[arguments[0]];
+var items = arguments[1];
+var remove = arguments[2];
+var clear = arguments[3];
+var snapshot = arguments[4];
+var missing = [];
+if (clear) {
+    storage.clear();
+}
+remove.forEach(function (key) {
+    if (storage.getItem(key) === null) {
+        missing.push(key);
+    }
+    storage.removeItem(key);
+});
+Object.keys(items).forEach(function (key) {
+    storage.setItem(key, items[key]);
+});
+var result = {missing: missing, items: null};
+if (snapshot) {
+    result.items = {};
+    for (var i = 0; i < storage.length; i++) {
+        var key = storage.key(i);
+        result.items[key] = storage.getItem(key);
+    }
+}
+return result;'''
+
+STATE_CAPTURE_SCRIPT = '''var names = arguments[0];
+var callback = arguments[arguments.length - 1];
+
+function dumpStorage(storage) {
+    var items = {};
+    for (var i = 0; i < storage.length; i++) {
+        var key = storage.key(i);
+        items[key] = storage.getItem(key);
+    }
+    return items;
+}
+
+function request(req) {
+    return new Promise((resolve, reject) => {
+        req.onsuccess = () => resolve(req.result);
+        req.onerror = () => reject(req.error);
+    });
+}
+
+function dumpDatabase(name) {
+    return new Promise((resolve, reject) => {
+        var open = indexedDB.open(name);
+        // Opening a database that doesn't exist creates it, which the abort undoes.
+        open.onupgradeneeded = () => open.transaction.abort();
+        open.onerror = () => reject(open.error);
+        open.onsuccess = () => {
+            var db = open.result;
+            var storeNames = Array.from(db.objectStoreNames);
+            var result = {version: db.version, stores: {}};
+            if (!storeNames.length) {
+                db.close();
+                resolve(result);
+                return;
+            }
+            var transaction = db.transaction(storeNames, 'readonly');
+            Promise.all(storeNames.map((storeName) => {
+                var store = transaction.objectStore(storeName);
+                var indexes = Array.from(store.indexNames).map((indexName) => {
+                    var index = store.index(indexName);
+                    return {
+                        name: indexName,
+                        keyPath: index.keyPath,
+                        unique: index.unique,
+                        multiEntry: index.multiEntry
+                    };
+                });
+                return Promise.all([request(store.getAllKeys()), request(store.getAll())]).then((records) => {
+                    result.stores[storeName] = {
+                        keyPath: store.keyPath,
+                        autoIncrement: store.autoIncrement,
+                        indexes: indexes,
+                        // Keys are part of the values unless the store uses out-of-line keys.
+                        keys: store.keyPath === null ? records[0] : null,
+                        values: records[1]
+                    };
+                });
+            })).then(() => { db.close(); resolve(result); }, (e) => { db.close(); reject(e); });
+        };
+    });
+}
+
+var state = {localStorage: {}, sessionStorage: {}, indexedDB: {}, failed: []};
+try {
+    state.localStorage = dumpStorage(window.localStorage);
+    state.sessionStorage = dumpStorage(window.sessionStorage);
+} catch (e) {}
+Promise.all(names.map((name) => dumpDatabase(name).then(
+    (db) => { state.indexedDB[name] = db; },
+    () => { state.failed.push(name); }
+))).then(() => callback(state));'''
+
+STATE_RESTORE_SCRIPT = '''var state = arguments[0];
+var callback = arguments[arguments.length - 1];
+
+function fillStorage(storage, items) {
+    storage.clear();
+    Object.keys(items).forEach((key) => storage.setItem(key, items[key]));
+}
+
+function restoreDatabase(name, db) {
+    return new Promise((resolve, reject) => {
+        var deletion = indexedDB.deleteDatabase(name);
+        deletion.onerror = () => reject(deletion.error);
+        // The page still holds the database open, fail rather than wait for it to let go.
+        deletion.onblocked = () => reject(new Error('blocked'));
+        deletion.onsuccess = () => {
+            var open = indexedDB.open(name, db.version);
+            open.onerror = () => reject(open.error);
+            open.onupgradeneeded = () => {
+                var database = open.result;
+                Object.keys(db.stores).forEach((storeName) => {
+                    var spec = db.stores[storeName];
+                    var options = {autoIncrement: spec.autoIncrement};
+                    if (spec.keyPath !== null) {
+                        options.keyPath = spec.keyPath;
+                    }
+                    var store = database.createObjectStore(storeName, options);
+                    spec.indexes.forEach((index) => {
+                        var options = {unique: index.unique, multiEntry: index.multiEntry};
+                        store.createIndex(index.name, index.keyPath, options);
+                    });
+                    spec.values.forEach((value, i) => {
+                        if (spec.keys === null) {
+                            store.put(value);
+                        } else {
+                            store.put(value, spec.keys[i]);
+                        }
+                    });
+                });
+            };
+            open.onsuccess = () => {
+                open.result.close();
+                resolve();
+            };
+        };
+    });
+}
+
+var failed = [];
+try {
+    fillStorage(window.localStorage, state.localStorage || {});
+    fillStorage(window.sessionStorage, state.sessionStorage || {});
+} catch (e) {
+    failed.push('storage');
+}
+var databases = state.indexedDB || {};
+Promise.all(Object.keys(databases).map((name) => restoreDatabase(name, databases[name]).catch(() => failed.push(name))))
+    .then(() => callback(failed));'''
+
+PERFORMANCE_ENTRY_TYPES = ('navigation', 'resource', 'paint', 'largest-contentful-paint', 'longtask')
+
+# Observes the requested entry types into a buffer that lives as long as the document. Entries are numbered so a
+# cursor can ask for the ones after the last it saw. The oldest entries are dropped beyond the limit.
+PERFORMANCE_SCRIPT = '''var types = arguments[0];
+var after = arguments[1];
+var limit = 10000;
+var state = window.__extendedWebdriverPerformance;
+if (!state) {
+    state = {
+        document: Date.now().toString(36) + Math.random().toString(36).slice(2),
+        next: 0,
+        entries: [],
+        observers: {}
+    };
+    window.__extendedWebdriverPerformance = state;
+}
+
+function record(entries) {
+    entries.forEach((entry) => {
+        var data = JSON.parse(JSON.stringify(entry));
+        delete data.element;
+        state.entries.push({sequence: state.next++, type: entry.entryType, data: data});
+    });
+    if (state.entries.length > limit) {
+        state.entries.splice(0, state.entries.length - limit);
+    }
+}
+
+var supported = (window.PerformanceObserver && PerformanceObserver.supportedEntryTypes) || [];
+types.forEach((type) => {
+    if (state.observers[type] || supported.indexOf(type) < 0) {
+        return;
+    }
+    var observer = new PerformanceObserver((list) => record(list.getEntries()));
+    observer.observe({type: type, buffered: true});
+    state.observers[type] = observer;
+});
+Object.keys(state.observers).forEach((type) => record(state.observers[type].takeRecords()));
+
+var start = after && after.document == state.document ? after.sequence : 0;
+var first = state.entries.length ? state.entries[0].sequence : state.next;
+var result = {document: state.document, url: location.href, sequence: state.next, dropped: first > start, entries: {}};
+types.forEach((type) => { result.entries[type] = []; });
+state.entries.forEach((entry) => {
+    if (entry.sequence >= start && entry.type in result.entries) {
+        result.entries[entry.type].push(entry.data);
+    }
+});
+return result;'''
+
+# Keeps the last entries logged to the console, uncaught errors and unhandled rejections in a ring buffer that lives as
+# long as the document. Entries are numbered so a reader can ask for the ones after the last it saw.
+CONSOLE_INSTALL_SCRIPT = '''(function (size) {
+    var buffer = window.__extendedWebdriverConsole;
+    if (buffer) {
+        buffer.size = size;
+        return;
+    }
+    buffer = {
+        document: Date.now().toString(36) + Math.random().toString(36).slice(2),
+        size: size,
+        next: 0,
+        entries: []
+    };
+    window.__extendedWebdriverConsole = buffer;
+
+    function format(value) {
+        if (typeof value == 'string') {
+            return value;
+        }
+        if (value instanceof Error) {
+            return value.stack || String(value);
+        }
+        try {
+            var json = JSON.stringify(value);
+            return json === undefined ? String(value) : json;
+        } catch (e) {
+            return String(value);
+        }
+    }
+
+    function push(level, message, source) {
+        buffer.entries.push({
+            sequence: buffer.next++,
+            level: level,
+            message: message,
+            source: source || null,
+            timestamp: Date.now()
+        });
+        if (buffer.entries.length > buffer.size) {
+            buffer.entries.splice(0, buffer.entries.length - buffer.size);
+        }
+    }
+
+    ['log', 'info', 'warn', 'error', 'debug'].forEach((level) => {
+        var original = console[level];
+        console[level] = function () {
+            push(level, Array.from(arguments).map(format).join(' '));
+            return original.apply(console, arguments);
+        };
+    });
+    window.addEventListener('error', (event) => {
+        push('error', event.message, event.filename ? event.filename + ':' + event.lineno + ':' + event.colno : null);
+    });
+    window.addEventListener('unhandledrejection', (event) => {
+        push('error', 'Unhandled rejection: ' + format(event.reason));
+    });
+})(arguments[0]);'''
+
+CONSOLE_READ_SCRIPT = (
+    CONSOLE_INSTALL_SCRIPT
+    + '''
+var after = arguments[1];
+var buffer = window.__extendedWebdriverConsole;
+var start = after && after.document == buffer.document ? after.sequence : 0;
+var first = buffer.entries.length ? buffer.entries[0].sequence : buffer.next;
+return {
+    document: buffer.document,
+    sequence: buffer.next,
+    dropped: Math.max(0, first - start),
+    entries: buffer.entries.filter((entry) => entry.sequence >= start)
+};'''
+)
+
+SET_COORDINATES_SCRIPT = '''var latitude = arguments[0];
+var longitude = arguments[1];
+window.navigator.geolocation.getCurrentPosition = function(success) {
+    var position = {
+        "coords" : {
+            "latitude": latitude,
+            "longitude": longitude
+        }
+    };
+    success(position);
+}'''
+
+GET_COORDINATES_SCRIPT = '''var latitude = ''
+var longitude = ''
+window.navigator.geolocation.getCurrentPosition(function(pos) {
+    latitude = pos.coords.latitude;
+    longitude = pos.coords.longitude;
+});
+return [latitude, longitude];'''
+
+BULK_FIELDS = ('element', 'text', 'tag_name', 'rect', 'displayed')
+BULK_FIELD_PREFIXES = ('attribute:', 'property:', 'style:')
+
+
+class JsBatchError(Exception):
+    """ Thrown when one or more operations in a batch raised an error in the browser. """
+
+    def __init__(self, errors: dict, results: list):
+        self.errors = errors
+        self.results = results
+        super().__init__('; '.join(f'Operation {index}: {message}' for index, message in errors.items()))
+
+
+class IndexedDBError(Exception):
+    """ Thrown when a database, object store or index can't be read. """
+
+    pass
+
+
+class KeyRange:
+    """
+    A range of IndexedDB keys, the equivalent of IDBKeyRange. A bound of None leaves that side of the range open.
+
+    KeyRange(lower=100, upper=200, upper_open=True)  # 100 <= key < 200
+    KeyRange.only('pending')
+    """
+
+    def __init__(self, lower=None, upper=None, lower_open: bool = False, upper_open: bool = False):
+        self.lower = lower
+        self.upper = upper
+        self.lower_open = lower_open
+        self.upper_open = upper_open
+
+    @classmethod
+    def only(cls, key) -> 'KeyRange':
+        return cls(lower=key, upper=key)
+
+    def to_dict(self) -> dict:
+        return {'lower': self.lower, 'upper': self.upper, 'lowerOpen': self.lower_open, 'upperOpen': self.upper_open}
+
+
+class ScriptHelpers:
+    """ Helpers that return the result of a single script as it is, so their calls can also be awaited or queued. """
+
+    # Whether a helper may answer without running its script. Batches must queue every call to keep results in order.
+    _can_skip_script = True
 
-class Js:
     def __init__(self, browser):
         self.browser = browser
-        self.console = Console(self.browser)
-        self.window = Window(self.browser)
         self.mouse_events = MouseEvents(self.browser)
 
     def focus(self, element: WebElement) -> None:
         """ Focuses on an element. """
-        self.browser.execute_script('arguments[0].focus();', element)
+        return self.browser.execute_script('arguments[0].focus();', element)
 
     def click(self, element: WebElement) -> None:
         """ Clicks on an element. """
-        self.browser.execute_script('arguments[0].click();', element)
+        return self.browser.execute_script('arguments[0].click();', element)
 
     def blur(self, element: WebElement) -> None:
         """ Clear the focus from a selected web element. """
-        self.browser.execute_script('arguments[0].blur();', element)
+        return self.browser.execute_script('arguments[0].blur();', element)
 
     def scroll_into_view(self, element: WebElement) -> None:
         """ Scrolls the element into view.  """
-        self.browser.execute_script("arguments[0].scrollIntoView();", element)
+        return self.browser.execute_script("arguments[0].scrollIntoView();", element)
 
     def get_bounding_client_rect(self, element: WebElement) -> dict:
         """ Gets the bounding client rect of an element. """
@@ -42,48 +605,207 @@ class Js:
         """ Removes an element's attribute. """
         return self.browser.execute_script('return arguments[0].removeAttribute(arguments[1]);', element, attribute)
 
+    def get_properties(self, elements, fields) -> dict:
+        """
+        Reads the same fields from many elements in one round trip and returns them column-wise, one list per field in
+        the order of the elements.
+
+        browser.js.get_properties('table tr > td', ['text', 'attribute:data-id', 'style:color'])
+        # {'text': ['a', 'b'], 'attribute:data-id': ['1', '2'], 'style:color': ['rgb(0, 0, 0)', 'rgb(0, 0, 0)']}
+
+        :param elements: A list of elements, or a CSS selector resolved inside the page.
+        :param fields: Any of 'element', 'text', 'tag_name', 'rect' and 'displayed', or 'attribute:<name>',
+                       'property:<name>' and 'style:<name>' for attributes, DOM properties and computed styles.
+        """
+        fields = list(fields)
+        for field in fields:
+            if field not in BULK_FIELDS and not field.startswith(BULK_FIELD_PREFIXES):
+                raise ValueError(f'Unknown field: {field}')
+        if not isinstance(elements, str):
+            elements = list(elements)
+            if not elements and self._can_skip_script:
+                return {field: [] for field in fields}
+        with self.browser.read_only():
+            return self.browser.execute_script(BULK_PROPERTIES_SCRIPT, elements, fields)
+
     def get_timezone_offset(self) -> int:
         """ Gets the timezone offset of the browser in minutes. """
-        return self.execute_script('return new Date().getTimezoneOffset();')
+        return self.browser.execute_script('return new Date().getTimezoneOffset();')
 
     def set_coordinates(self, coordinates: tuple) -> None:
         """ Sets the geolocation for location services. """
-        script = '''var latitude = arguments[0];
-var longitude = arguments[1];
-window.navigator.geolocation.getCurrentPosition = function(success) {
-    var position = {
-        "coords" : {
-            "latitude": latitude,
-            "longitude": longitude
-        }
-    };
-    success(position);
-}'''
-        self.browser.execute_script(
-            script,
-            *coordinates,
-        )
+        return self.browser.scripts.call('geolocation.set', SET_COORDINATES_SCRIPT, *coordinates)
 
     def get_coordinates(self) -> tuple:
-        script = '''var latitude = ''
-var longitude = ''
-window.navigator.geolocation.getCurrentPosition(function(pos) {
-    latitude = pos.coords.latitude;
-    longitude = pos.coords.longitude;
-});
-return [latitude, longitude];'''
-        return self.browser.execute_script(script)
+        return self.browser.scripts.call('geolocation.get', GET_COORDINATES_SCRIPT)
 
 
-class Console:
+class Js(ScriptHelpers):
+    def __init__(self, browser):
+        super().__init__(browser)
+        self.console = Console(self.browser)
+        self.window = Window(self.browser)
+        self.performance = Performance(self.browser)
+
+    def batch(self) -> 'JsBatch':
+        """
+        Returns a batch that queues calls to the Js helpers and sends them to the browser as a single script.
+
+        with browser.js.batch() as batch:
+            batch.scroll_into_view(element)
+            batch.focus(element)
+            batch.get_attribute(element, 'value')
+        batch.results  # [None, None, 'value']
+        """
+        return JsBatch(self.browser)
+
+
+class AsyncJs(ScriptHelpers):
+    """
+    The Js helpers of AsyncExtendedWebdriver, whose calls return awaitables. Helpers that process the result of a
+    script before returning it, such as batches, web storage, console capture, performance cursors and IndexedDB
+    reads, aren't available.
+
+    await browser.js.click(element)
+    state = await browser.js.window.get_state()
+    """
+
+    def __init__(self, browser):
+        super().__init__(browser)
+        self.console = ConsoleOutput(self.browser)
+        self.window = WindowState(self.browser)
+
+
+def batch_script(scripts) -> str:
+    """
+    Returns a script that runs execute_script style scripts in order, with their arguments from the list passed as its
+    first argument. They are embedded as function literals rather than built with new Function, which a Content
+    Security Policy without 'unsafe-eval' blocks.
+    """
+    functions = ',\n'.join(f'function () {{\n{script}\n}}' for script in scripts)
+    return f'''var operations = [
+{functions}
+];
+var results = [];
+for (var i = 0; i < operations.length; i++) {{
+    try {{
+        results.push({{value: operations[i].apply(window, arguments[0][i])}});
+    }} catch (e) {{
+        results.push({{error: String(e && e.message || e)}});
+    }}
+}}
+return results;'''
+
+
+class _BatchRecorder:
+    """ Stands in for the browser and records synchronous scripts instead of executing them. """
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.operations = []
+        self.scripts = InlineScripts(self)
+
+    def execute_script(self, script, *args):
+        self.operations.append([script, list(args)])
+
+    def execute_async_script(self, script, *args):
+        raise TypeError('Asynchronous scripts can not be batched.')
+
+    def read_only(self):
+        return nullcontext()
+
+
+class JsBatch(ScriptHelpers):
+    """
+    Queues calls to the Js helpers and runs them in order with one execute_script call. Only the helpers that return
+    the result of a single script as it is can be queued, so web storage, console capture, performance and IndexedDB
+    aren't available on a batch.
+    """
+
+    _can_skip_script = False
+
+    def __init__(self, browser):
+        self._browser = browser
+        self.results = None
+        super().__init__(_BatchRecorder(browser))
+        self.console = ConsoleOutput(self.browser)
+
+    def __len__(self):
+        return len(self.browser.operations)
+
+    def execute(self) -> list:
+        """
+        Sends the queued operations to the browser and returns their results in order. The queue is emptied so the
+        batch can be reused.
+
+        :raises JsBatchError: If any operation raised an error. Every operation is still attempted.
+        """
+        operations, self.browser.operations = self.browser.operations, []
+        if not operations:
+            self.results = []
+            return self.results
+        scripts = [script for script, _ in operations]
+        response = self._browser.execute_script(batch_script(scripts), [args for _, args in operations])
+        self.results = [result.get('value') for result in response]
+        errors = {index: result['error'] for index, result in enumerate(response) if 'error' in result}
+        if errors:
+            raise JsBatchError(errors, self.results)
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.execute()
+
+
+class ConsoleOutput:
     def __init__(self, browser):
         self.browser = browser
 
     def log(self, data: str):
-        self.browser.execute_script('console.log(arguments[0]);', data)
+        return self.browser.execute_script('console.log(arguments[0]);', data)
 
     def clear(self):
-        self.browser.execute_script('console.clear();')
+        return self.browser.execute_script('console.clear();')
+
+
+class Console(ConsoleOutput):
+    def __init__(self, browser):
+        super().__init__(browser)
+        self.buffer_size = None
+        self.dropped = 0
+        self._position = None
+
+    def capture(self, size: int = 1000) -> None:
+        """
+        Starts capturing console messages, uncaught errors and unhandled rejections into a ring buffer in the page that
+        keeps the last size entries. The driver installs it again after every navigation, and read installs it in
+        windows and frames that don't have it yet. Messages logged before it is installed aren't captured.
+        """
+        self.buffer_size = size
+        self.install()
+
+    def stop_capture(self) -> None:
+        """ Stops installing the buffer in new documents. """
+        self.buffer_size = None
+
+    def install(self) -> None:
+        with self.browser.read_only():
+            self.browser.execute_script(CONSOLE_INSTALL_SCRIPT, self.buffer_size)
+
+    def read(self) -> list:
+        """
+        Returns the entries captured since the previous read in one round trip, as dicts with 'sequence', 'level',
+        'message', 'source' and 'timestamp'. A new document is read from its first entry. Entries that were pushed out
+        of the buffer before they could be read are counted in dropped.
+        """
+        with self.browser.read_only():
+            result = self.browser.execute_script(CONSOLE_READ_SCRIPT, self.buffer_size or 1000, self._position)
+        self._position = {'document': result['document'], 'sequence': result['sequence']}
+        self.dropped += result['dropped']
+        return result['entries']
 
 
 class MouseEvents:
@@ -94,40 +816,253 @@ class MouseEvents:
         script = '''var clickEvent = document.createEvent('MouseEvents');
 clickEvent.initEvent(arguments[1], true, true);
 arguments[0].dispatchEvent(clickEvent);'''
-        self.browser.execute_script(script, element, click_event)
+        return self.browser.execute_script(script, element, click_event)
 
     def click(self, element):
-        self._trigger_mouse_event(element, 'click')
+        return self._trigger_mouse_event(element, 'click')
 
     def mouse_up(self, element):
-        self._trigger_mouse_event(element, 'mouseup')
+        return self._trigger_mouse_event(element, 'mouseup')
 
     def mouse_down(self, element):
-        self._trigger_mouse_event(element, 'mousedown')
+        return self._trigger_mouse_event(element, 'mousedown')
 
     def mouse_over(self, element):
-        self._trigger_mouse_event(element, 'mouseover')
+        return self._trigger_mouse_event(element, 'mouseover')
+
+
+class Performance:
+    def __init__(self, browser):
+        self.browser = browser
+
+    def _read(self, types, after: (None, dict)) -> dict:
+        with self.browser.read_only():
+            return self.browser.execute_script(PERFORMANCE_SCRIPT, list(types), after)
+
+    def get_entries(self, types=PERFORMANCE_ENTRY_TYPES) -> dict:
+        """
+        Reads Navigation Timing, Resource Timing, paint, largest contentful paint and long task entries of the current
+        document in one round trip. Returns a dict with the 'entries' by type, the 'url' and an id of the 'document'.
+
+        :param types: Entry types to read. Types the browser doesn't support are returned empty.
+        """
+        return self._read(types, None)
+
+    def cursor(self, types=PERFORMANCE_ENTRY_TYPES) -> 'PerformanceCursor':
+        """
+        Returns a cursor whose reads only return the entries recorded since its previous read.
+
+        cursor = browser.js.performance.cursor()
+        browser.get('/dashboard')
+        cursor.read()['entries']['resource']
+        """
+        return PerformanceCursor(self, types)
 
 
-class Window:
+class PerformanceCursor:
+    """ Reads performance entries incrementally. A new document is read from its first entry. """
+
+    def __init__(self, performance: Performance, types=PERFORMANCE_ENTRY_TYPES):
+        self.performance = performance
+        self.types = list(types)
+        self.position = None
+
+    def read(self) -> dict:
+        """ Returns the new entries like Performance.get_entries. 'dropped' is True if some were lost to the limit. """
+        result = self.performance._read(self.types, self.position)
+        self.position = {'document': result['document'], 'sequence': result['sequence']}
+        return result
+
+
+class WindowState:
+    """ Reads and replaces the storage of the current origin, each in a single script. """
+
     def __init__(self, browser):
         self.browser = browser
+
+    def get_state(self, databases: list = ()) -> dict:
+        """
+        Reads localStorage, sessionStorage and whole IndexedDB databases, with their object stores and indexes, in one
+        round trip. Returns a dict with 'localStorage', 'sessionStorage', 'indexedDB' and 'failed', the names of the
+        databases that couldn't be read. Records must be JSON serializable to survive the trip.
+
+        :param databases: Names of the IndexedDB databases to read.
+        """
+        with self.browser.read_only():
+            return self.browser.execute_async_script(STATE_CAPTURE_SCRIPT, list(databases))
+
+    def set_state(self, state: dict) -> list:
+        """
+        Replaces localStorage, sessionStorage and the IndexedDB databases in a state from get_state in one round trip
+        and returns the names of the databases that couldn't be restored, or 'storage' if web storage couldn't be.
+        Databases the page holds open can't be replaced and are returned as failed.
+        """
+        return self.browser.execute_async_script(STATE_RESTORE_SCRIPT, state)
+
+    def clear(self, databases: (None, list) = None) -> list:
+        """
+        Clears localStorage, sessionStorage and IndexedDB for the current origin in one round trip and returns the
+        names of the databases that couldn't be deleted.
+
+        :param databases: Names of the IndexedDB databases to delete. By default every database reported by
+                          indexedDB.databases() is deleted, where the browser supports it.
+        """
+        script = '''var names = arguments[0];
+var callback = arguments[arguments.length - 1];
+try {
+    window.localStorage.clear();
+    window.sessionStorage.clear();
+} catch (e) {}
+
+function deleteAll(names) {
+    var failed = [];
+    Promise.all(names.map((name) => new Promise((resolve) => {
+        try {
+            var req = indexedDB.deleteDatabase(name);
+            req.onsuccess = () => resolve();
+            req.onerror = req.onblocked = () => { failed.push(name); resolve(); };
+        } catch (e) {
+            failed.push(name);
+            resolve();
+        }
+    }))).then(() => callback(failed));
+}
+
+if (names !== null) {
+    deleteAll(names);
+} else if (window.indexedDB && indexedDB.databases) {
+    indexedDB.databases().then((databases) => deleteAll(databases.map((d) => d.name)), () => callback([]));
+} else {
+    callback([]);
+}'''
+        return self.browser.execute_async_script(script, databases)
+
+
+class Window(WindowState):
+    def __init__(self, browser):
+        super().__init__(browser)
         self.local_storage = LocalStorage(self.browser)
+        self.session_storage = SessionStorage(self.browser)
         self.indexed_db = IndexedDB(self.browser)
 
+    def set_state(self, state: dict) -> list:
+        """ Also drops the cached web storage. """
+        for storage in (self.local_storage, self.session_storage):
+            storage.invalidate()
+        return super().set_state(state)
 
-class LocalStorage:
-    def __init__(self, browser):
+
+class WebStorage(MutableMapping):
+    """
+    A dict-like view of localStorage or sessionStorage for the current document. Values are stored as strings by the
+    browser. Reading the whole storage, updating many keys and restoring a snapshot each take one round trip.
+
+    With cache enabled the storage is read once and served locally until the page could have changed it, i.e. until
+    the driver's next navigation, window or frame switch, interaction or script.
+
+    flags = browser.js.window.local_storage
+    saved = flags.snapshot()
+    flags.update({'feature.checkout': 'on', 'feature.search': 'off'})
+    ...
+    flags.restore(saved)
+    """
+
+    def __init__(self, browser, storage: str, cache: bool = False):
         self.browser = browser
+        self.storage = storage
+        self.cache = cache
+        self._items = None
+        self._items_epoch = None
+
+    def _cached(self) -> (None, dict):
+        if not self.cache or self._items is None or self._items_epoch != getattr(self.browser, '_epoch', None):
+            return None
+        return self._items
+
+    def _remember(self, items: (None, dict)) -> None:
+        self._items = items
+        self._items_epoch = getattr(self.browser, '_epoch', None) if items is not None else None
+
+    def invalidate(self) -> None:
+        """ Drops the cached items so the next read goes to the browser. """
+        self._remember(None)
+
+    def snapshot(self) -> dict:
+        """ Returns every key and value in one round trip. """
+        items = self._cached()
+        if items is None:
+            with self.browser.read_only():
+                items = self.browser.execute_script(STORAGE_SNAPSHOT_SCRIPT, self.storage) or {}
+            self._remember(items)
+        return dict(items)
+
+    def _write(self, items: dict = None, remove: list = (), clear: bool = False) -> list:
+        """ Applies removals and writes in one round trip and returns the removed keys that didn't exist. """
+        script_args = (self.storage, dict(items or {}), list(remove), clear, self.cache)
+        result = self.browser.execute_script(STORAGE_WRITE_SCRIPT, *script_args)
+        result = result or {'missing': [], 'items': None}
+        self._remember(result['items'])
+        return result['missing']
+
+    def update(self, *args, **kwargs) -> None:
+        """ Sets many keys in one round trip. Takes the same arguments as dict.update. """
+        self._write(dict(*args, **kwargs))
+
+    def restore(self, snapshot: dict) -> None:
+        """ Replaces the whole storage with a snapshot in one round trip. """
+        self._write(snapshot, clear=True)
+
+    def clear(self) -> None:
+        self._write(clear=True)
+
+    def __getitem__(self, key):
+        items = self._cached()
+        if items is not None:
+            return items[key]
+        if self.cache:
+            return self.snapshot()[key]
+        with self.browser.read_only():
+            value = self.browser.execute_script(f'return window.{self.storage}.getItem(arguments[0]);', key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._write({key: value})
+
+    def __delitem__(self, key):
+        if self._write(remove=[key]):
+            raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __len__(self):
+        items = self._cached()
+        if items is not None:
+            return len(items)
+        with self.browser.read_only():
+            return self.browser.execute_script(f'return window.{self.storage}.length;')
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.snapshot()!r})'
+
+
+class LocalStorage(WebStorage):
+    def __init__(self, browser, cache: bool = False):
+        super().__init__(browser, 'localStorage', cache)
 
     def get_item(self, key):
         return self.browser.execute_script('return window.localStorage.getItem(arguments[0]);', key)
 
     def set_item(self, key, value):
-        self.browser.execute_script('window.localStorage.setItem(arguments[0], arguments[1]);', key, value)
+        self.invalidate()
+        return self.browser.execute_script('window.localStorage.setItem(arguments[0], arguments[1]);', key, value)
 
-    def clear(self):
-        self.browser.execute_script('window.localStorage.clear();')
+
+class SessionStorage(WebStorage):
+    def __init__(self, browser, cache: bool = False):
+        super().__init__(browser, 'sessionStorage', cache)
 
 
 class IndexedDB:
@@ -140,49 +1075,76 @@ class IndexedDB:
         :param database_name: Name of the database to search in.
         :param object_name: Name of the object to find.
         """
-        script = '''var databaseName = arguments[0];
-var objectName = arguments[1];
-var callback = arguments[arguments.length - 1];
+        script = INDEXED_DB_GET_ALL_SCRIPT
+        return self.browser.scripts.call_async('indexedDB.getAll', script, database_name, object_name)
 
-var db_request = window.indexedDB.open(databaseName);
+    def delete_database(self, database_name: str):
+        return self.browser.scripts.call_async('indexedDB.delete', INDEXED_DB_DELETE_SCRIPT, database_name)
 
-db_request.onerror = function(event) {
-    callback(null);
-};
+    def _execute(self, name, script, *args) -> dict:
+        with self.browser.read_only():
+            result = self.browser.scripts.call_async(name, script, *args)
+        if result is None or 'error' in result:
+            raise IndexedDBError(result['error'] if result else 'No result from the browser.')
+        return result
 
-db_request.onsuccess = function(event) {
-    var db = db_request.result;
-    var transaction = db.transaction(objectName);
-    var objectStore = transaction.objectStore(objectName);
-    var data_request = objectStore.getAll();
+    def count(self, database_name: str, object_name: str, index: str = None, key_range: KeyRange = None) -> int:
+        """
+        Counts the records in an object store without reading them.
 
-    data_request.onerror = function(event) {
-        callback(null);
-    };
+        :param database_name: Name of the database to search in.
+        :param object_name: Name of the object store to count.
+        :param index: Name of an index to count by instead of the primary key.
+        :param key_range: Only count records whose key, or index key, is in this range.
+        """
+        key_range = key_range.to_dict() if key_range is not None else None
+        result = self._execute('indexedDB.count', INDEXED_DB_COUNT_SCRIPT, database_name, object_name, index, key_range)
+        return result['count']
 
-    data_request.onsuccess = function(event) {
-        callback(data_request.result);
-    };
-};'''
-        return self.browser.execute_async_script(script, database_name, object_name)
+    def iter_records(
+        self,
+        database_name: str,
+        object_name: str,
+        batch_size: int = 500,
+        index: str = None,
+        key_range: KeyRange = None,
+        fields: (None, list) = None,
+    ):
+        """
+        Yields the records of an object store in key order, reading them with a cursor one batch per round trip so
+        neither the browser nor the test holds the whole store at once.
 
-    def delete_database(self, database_name: str):
-        script = '''var databaseName = arguments[0];
-var callback = arguments[arguments.length - 1];
+        for record in browser.js.window.indexed_db.iter_records('cache', 'orders', index='status',
+                                                                 key_range=KeyRange.only('pending'), fields=['id']):
+            ...
 
-try {
-    var req = indexedDB.deleteDatabase(databaseName);
-}
-catch (DOMException) {
-    callback(false);
-}
-req.onsuccess = function () {
-    callback(true);
-};
-req.onerror = function () {
-    callback(false);
-};
-req.onblocked = function () {
-    callback(false);
-};'''
-        return self.browser.execute_async_script(script, database_name)
+        :param database_name: Name of the database to search in.
+        :param object_name: Name of the object store to read.
+        :param batch_size: Number of records fetched per round trip.
+        :param index: Name of an index to read in index key order instead of primary key order.
+        :param key_range: Only read records whose key, or index key, is in this range.
+        :param fields: Only return these fields of each record as a dict. Nested fields are separated by dots and
+                       missing fields are None.
+        :raises IndexedDBError: If the database, object store or index can't be read.
+        """
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1.')
+        key_range = key_range.to_dict() if key_range is not None else None
+        fields = list(fields) if fields is not None else None
+        after = None
+        while True:
+            page = self._execute(
+                'indexedDB.page',
+                INDEXED_DB_PAGE_SCRIPT,
+                database_name,
+                object_name,
+                index,
+                key_range,
+                after,
+                batch_size,
+                fields,
+            )
+            yield from page['values']
+            if page['done']:
+                return
+            after = page['last']
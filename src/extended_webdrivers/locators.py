@@ -0,0 +1,62 @@
+from selenium.webdriver.common.by import By
+
+# Defines findAll(locator, root), which returns the elements matching a locator from js_locator inside root, or the
+# document when root is omitted. Scripts that resolve locators in the page start with it.
+FIND_ALL_SCRIPT = '''function findAll(locator, root) {
+    root = root || document;
+    var value = locator.value;
+    if (locator.using == 'css selector') {
+        return Array.from(root.querySelectorAll(value));
+    }
+    if (locator.using == 'xpath') {
+        var snapshot = document.evaluate(value, root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        var found = [];
+        for (var i = 0; i < snapshot.snapshotLength; i++) {
+            if (snapshot.snapshotItem(i).nodeType == Node.ELEMENT_NODE) {
+                found.push(snapshot.snapshotItem(i));
+            }
+        }
+        return found;
+    }
+    if (locator.using == 'link text' || locator.using == 'partial link text') {
+        return Array.from(root.querySelectorAll('a')).filter((link) => {
+            var text = link.innerText.trim();
+            return locator.using == 'link text' ? text == value : text.indexOf(value) >= 0;
+        });
+    }
+    throw new Error('Unsupported locator strategy: ' + locator.using);
+}
+'''
+
+
+def _quote(value: str) -> str:
+    """ Quotes a value for a CSS attribute selector. """
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def w3c_locator(by, value):
+    """ Translates the locator strategies W3C drivers don't support into CSS selectors. """
+    if by == By.ID:
+        return By.CSS_SELECTOR, f'[id={_quote(value)}]'
+    if by == By.TAG_NAME:
+        return By.CSS_SELECTOR, value
+    if by == By.CLASS_NAME:
+        return By.CSS_SELECTOR, f'[class~={_quote(value)}]'
+    if by == By.NAME:
+        return By.CSS_SELECTOR, f'[name={_quote(value)}]'
+    return by, value
+
+
+def js_locator(locator) -> dict:
+    """
+    Translates a locator into the form findAll takes. A locator is a (by, value) tuple as used by find_element, or a
+    string, which is taken as a CSS selector.
+    """
+    if isinstance(locator, str):
+        by, value = By.CSS_SELECTOR, locator
+    else:
+        by, value = locator
+    by, value = w3c_locator(by, value)
+    if by not in (By.CSS_SELECTOR, By.XPATH, By.LINK_TEXT, By.PARTIAL_LINK_TEXT):
+        raise ValueError(f'Unsupported locator strategy: {by}')
+    return {'using': by, 'value': value}
@@ -0,0 +1,109 @@
+from urllib.parse import urlsplit, urlunsplit
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Long tasks block the main thread for the part of their duration over this many milliseconds.
+LONG_TASK_THRESHOLD = 50
+
+
+def percentile(values, percent: float) -> (None, float):
+    """ Returns the percentile of the values, interpolating linearly between the closest ranks. """
+    values = sorted(values)
+    if not values:
+        return None
+    rank = (len(values) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+def page_of(url: str) -> str:
+    """ Groups pages by URL without the query string and fragment. """
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, '', ''))
+
+
+class PerformanceAggregator:
+    """
+    Collects the timings of every document read with js.performance and summarizes them per page into percentiles.
+    All timings are in milliseconds from the start of the navigation.
+
+    aggregator = PerformanceAggregator()
+    cursor = browser.js.performance.cursor()
+    for url in urls:
+        browser.get(url)
+        aggregator.add(cursor.read())
+    assert aggregator.percentile('largest_contentful_paint', 95) < 2500
+
+    Metrics are 'ttfb', 'dom_content_loaded', 'load', 'first_paint', 'first_contentful_paint',
+    'largest_contentful_paint', 'total_blocking_time' and 'long_tasks' per document and 'resource_duration' per
+    resource.
+    """
+
+    def __init__(self, page=page_of):
+        """
+        :param page: Callable that returns the page a URL is summarized under. (Default: the URL without the query
+                     string and fragment)
+        """
+        self.page = page
+        self.documents = {}
+        self.resources = {}
+
+    def add(self, result: dict) -> None:
+        """ Adds a result of Performance.get_entries or PerformanceCursor.read. Reads of one document are merged. """
+        entries = result['entries']
+        page = self.page(result['url'])
+        for navigation in entries.get('navigation', []):
+            page = self.page(navigation['name'])
+        document = self.documents.setdefault(result['document'], {'page': page})
+        metrics = document.setdefault('metrics', {})
+        for navigation in entries.get('navigation', []):
+            metrics['ttfb'] = navigation['responseStart'] - navigation['startTime']
+            metrics['dom_content_loaded'] = navigation['domContentLoadedEventEnd']
+            if navigation['loadEventEnd']:
+                metrics['load'] = navigation['loadEventEnd']
+        for paint in entries.get('paint', []):
+            metrics[paint['name'].replace('-', '_')] = paint['startTime']
+        for largest in entries.get('largest-contentful-paint', []):
+            # Every candidate replaces the previous one, the last is the largest contentful paint.
+            metrics['largest_contentful_paint'] = largest['startTime']
+        for task in entries.get('longtask', []):
+            metrics['long_tasks'] = metrics.get('long_tasks', 0) + 1
+            blocking = max(0, task['duration'] - LONG_TASK_THRESHOLD)
+            metrics['total_blocking_time'] = metrics.get('total_blocking_time', 0) + blocking
+        durations = self.resources.setdefault(document['page'], [])
+        durations.extend(resource['duration'] for resource in entries.get('resource', []))
+
+    def values(self, metric: str, page: (None, str) = None) -> list:
+        """ Returns every recorded value of a metric, for one page or all of them. """
+        if metric == 'resource_duration':
+            if page is not None:
+                return list(self.resources.get(page, []))
+            return [value for durations in self.resources.values() for value in durations]
+        return [
+            document['metrics'][metric]
+            for document in self.documents.values()
+            if metric in document['metrics'] and (page is None or document['page'] == page)
+        ]
+
+    def percentile(self, metric: str, percent: float, page: (None, str) = None) -> (None, float):
+        """ Returns a percentile of a metric, for one page or all of them, or None if it was never recorded. """
+        return percentile(self.values(metric, page), percent)
+
+    def summary(self, percents=PERCENTILES) -> dict:
+        """ Returns {page: {metric: {'count': n, 'p50': ..., ...}}} for every page and metric recorded. """
+        pages = {document['page'] for document in self.documents.values()} | set(self.resources)
+        summary = {}
+        for page in sorted(pages):
+            metrics = set()
+            for document in self.documents.values():
+                if document['page'] == page:
+                    metrics.update(document['metrics'])
+            if self.resources.get(page):
+                metrics.add('resource_duration')
+            summary[page] = {}
+            for metric in sorted(metrics):
+                values = self.values(metric, page)
+                summary[page][metric] = {'count': len(values)}
+                summary[page][metric].update({f'p{percent}': percentile(values, percent) for percent in percents})
+        return summary
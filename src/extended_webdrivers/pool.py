@@ -0,0 +1,167 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from selenium.common.exceptions import WebDriverException
+
+LOGGER = logging.getLogger(__name__)
+
+
+class PoolExhausted(Exception):
+    """ Thrown when no driver becomes available before the checkout timeout. """
+
+    pass
+
+
+class DriverPool:
+    """
+    A thread-safe pool of pre-started extended drivers. Drivers are health checked on checkout, reset to a clean state
+    when they are returned and evicted once they have been used max_reuse times or fail either step.
+
+    pool = DriverPool(lambda: Chrome(options=options), size=4, max_reuse=50)
+    with pool.driver() as browser:
+        browser.get('https://angular.io/')
+    pool.close()
+    """
+
+    def __init__(self, factory, size: int = 1, max_reuse: (None, int) = None, prestart: bool = True):
+        """
+        :param factory: Callable that starts and returns a new driver.
+        :param size: The maximum number of drivers alive at once.
+        :param max_reuse: How many times a driver is handed out before it is replaced. (Default: unlimited)
+        :param prestart: Start every driver up front, in parallel, instead of on first checkout.
+        """
+        self.factory = factory
+        self.size = size
+        self.max_reuse = max_reuse
+        # Idle drivers, the most recently returned last. Waiters are notified whenever a driver or a slot frees up.
+        self._idle = []
+        self._uses = {}
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._alive = 0
+        self._closed = False
+        if prestart:
+            self._reserve(size)
+            with ThreadPoolExecutor(size) as executor:
+                futures = [executor.submit(self._start) for _ in range(size)]
+            drivers = []
+            error = None
+            for future in futures:
+                try:
+                    drivers.append(future.result())
+                except Exception as e:
+                    error = error or e
+            if error is not None:
+                # Quit the drivers that did start, or their browsers would outlive the failed pool.
+                for driver in drivers:
+                    self._evict(driver)
+                raise error
+            with self._available:
+                self._idle.extend(drivers)
+                self._available.notify(len(drivers))
+
+    def _reserve(self, count=1):
+        with self._available:
+            if self._closed:
+                raise PoolExhausted('The pool is closed.')
+            if self._alive + count > self.size:
+                return False
+            self._alive += count
+            return True
+
+    def _start(self):
+        """ Starts a driver for a slot that has already been reserved. """
+        try:
+            driver = self.factory()
+        except Exception:
+            with self._available:
+                self._alive -= 1
+                self._available.notify()
+            raise
+        self._uses[id(driver)] = 0
+        return driver
+
+    def _evict(self, driver):
+        with self._available:
+            self._alive -= 1
+            # The freed slot lets a waiter start a new driver.
+            self._available.notify()
+        self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except WebDriverException:
+            LOGGER.debug('Failed to quit evicted driver.', exc_info=True)
+
+    def checkout(self, timeout: (None, float) = None):
+        """
+        Returns a healthy driver, starting a new one if the pool has room.
+
+        :param timeout: The amount of time in seconds to wait for a driver to be returned when the pool is full.
+        :raises PoolExhausted: If no driver became available in time.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._available:
+                while not self._idle:
+                    if self._closed:
+                        raise PoolExhausted('The pool is closed.')
+                    if self._alive < self.size:
+                        self._alive += 1
+                        break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise PoolExhausted(f'No driver became available after {timeout} seconds.')
+                    self._available.wait(remaining)
+                driver = self._idle.pop() if self._idle else None
+            if driver is None:
+                return self._start()
+            # The health check only needs an answer from the browser, not a settled page.
+            with driver.unsynced():
+                healthy = driver.is_open()
+            if healthy:
+                return driver
+            self._evict(driver)
+
+    def checkin(self, driver) -> None:
+        """ Returns a driver to the pool, resetting it or evicting it if it can't be reused. """
+        self._uses[id(driver)] = self._uses.get(id(driver), 0) + 1
+        if self._closed or (self.max_reuse is not None and self._uses[id(driver)] >= self.max_reuse):
+            self._evict(driver)
+            return
+        try:
+            driver.reset_state()
+        except WebDriverException:
+            LOGGER.warning('Failed to reset driver, evicting it.', exc_info=True)
+            self._evict(driver)
+            return
+        with self._available:
+            self._idle.append(driver)
+            self._available.notify()
+
+    @contextmanager
+    def driver(self, timeout: (None, float) = None):
+        """ Checks out a driver for the duration of the context. """
+        driver = self.checkout(timeout)
+        try:
+            yield driver
+        finally:
+            self.checkin(driver)
+
+    def close(self) -> None:
+        """ Quits every idle driver. Drivers still checked out are quit when they are returned. """
+        with self._available:
+            self._closed = True
+            drivers, self._idle = self._idle, []
+            # Waiters give up rather than wait for drivers that will never be returned.
+            self._available.notify_all()
+        for driver in drivers:
+            self._evict(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,122 @@
+import re
+import statistics
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.wait import POLL_FREQUENCY
+
+
+def url_pattern(url: (None, str)) -> (None, str):
+    """ Groups URLs that differ only by ids, e.g. /orders/17 and /orders/42, by replacing numbers and hashes. """
+    if not url:
+        return None
+    parts = urlsplit(url)
+    path = re.sub(r'[0-9a-fA-F]{8,}(-[0-9a-fA-F]{4,})*|\d+', '*', parts.path)
+    return f'{parts.scheme}://{parts.netloc}{path}'
+
+
+class PollScheduler:
+    """
+    Spaces out the polls of a wait. Polls start fast and back off exponentially, never closer together than the
+    measured round trip of a poll, so a fast local browser is polled often while a remote grid isn't flooded. The time
+    waits on the same key usually take to settle is remembered, and once known the second poll goes straight to it.
+
+    One scheduler can be shared by several drivers, e.g. in a DriverPool, to pool what they learn.
+    """
+
+    def __init__(
+        self,
+        initial_interval: float = 0.01,
+        max_interval: float = POLL_FREQUENCY,
+        backoff: float = 2.0,
+        history: int = 20,
+    ):
+        """
+        :param initial_interval: Seconds between the first polls, unless a poll's round trip takes longer.
+        :param max_interval: The longest interval between polls.
+        :param backoff: The factor the interval grows by with every poll.
+        :param history: How many settle times are remembered per key.
+        """
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.history = history
+        self.round_trip = None
+        self.settle_times = {}
+        # Drivers sharing the scheduler wait on their own threads.
+        self._lock = threading.Lock()
+
+    def _observe_round_trip(self, duration: float) -> None:
+        with self._lock:
+            if self.round_trip is None:
+                self.round_trip = duration
+            else:
+                self.round_trip += 0.3 * (duration - self.round_trip)
+
+    def expected_settle(self, key) -> (None, float):
+        """ Returns the median time waits on the key took to settle, or None before any finished. """
+        with self._lock:
+            times = list(self.settle_times.get(key, ()))
+        return statistics.median(times) if times else None
+
+    def _record_settle(self, key, duration: float) -> None:
+        if key is not None:
+            with self._lock:
+                self.settle_times.setdefault(key, deque(maxlen=self.history)).append(duration)
+
+    def interval(self, attempt: int, max_interval: (None, float) = None) -> float:
+        """ Returns the seconds to wait after the given poll, counting from 0. """
+        minimum = max(self.initial_interval, self.round_trip or 0.0)
+        return min(max_interval or self.max_interval, minimum * self.backoff ** attempt)
+
+    def wait(
+        self,
+        condition,
+        timeout: float,
+        key=None,
+        max_interval: (None, float) = None,
+        quiet: float = 0.0,
+        message: str = '',
+    ):
+        """
+        Polls the condition until it returns a truthy value and returns it.
+
+        :param condition: Callable without arguments that checks the page.
+        :param timeout: Seconds to wait before giving up.
+        :param key: What to remember the settle time under, e.g. the kind of wait and the URL pattern.
+        :param max_interval: The longest interval between polls. (Default: max_interval of the scheduler)
+        :param quiet: Seconds the condition must keep holding before the wait ends.
+        :param message: Message of the TimeoutException.
+        :raises TimeoutException: If the condition doesn't hold, for the quiet period, within the timeout.
+        """
+        start = time.monotonic()
+        expected = self.expected_settle(key)
+        held_since = None
+        attempt = 0
+        while True:
+            poll_start = time.monotonic()
+            value = condition()
+            now = time.monotonic()
+            self._observe_round_trip(now - poll_start)
+            if value:
+                if held_since is None:
+                    held_since = poll_start
+                if now - held_since >= quiet:
+                    self._record_settle(key, held_since - start)
+                    return value
+            else:
+                held_since = None
+            remaining = start + timeout - now
+            if remaining <= 0:
+                raise TimeoutException(message)
+            delay = self.interval(attempt, max_interval)
+            if held_since is not None:
+                delay = min(delay, held_since + quiet - now)
+            elif attempt == 0 and expected is not None:
+                # Nothing is gained by polling before the page usually settles, up to the longest interval.
+                delay = max(delay, min(expected - (now - start), max_interval or self.max_interval))
+            attempt += 1
+            time.sleep(max(0.0, min(delay, remaining)))
@@ -0,0 +1,102 @@
+import json
+
+from selenium.common.exceptions import WebDriverException
+
+# Helpers live on this object in the page, by name.
+HELPERS = 'window.__extendedWebdriverHelpers'
+
+CALL_SCRIPT = f'''var helper = ({HELPERS} || {{}})[arguments[0]];
+if (!helper) {{
+    return {{missing: true}};
+}}
+return {{value: helper.apply(null, arguments[1])}};'''
+
+CALL_ASYNC_SCRIPT = f'''var callback = arguments[arguments.length - 1];
+var helper = ({HELPERS} || {{}})[arguments[0]];
+if (!helper) {{
+    callback({{missing: true}});
+    return;
+}}
+helper.apply(null, arguments[1].concat([(value) => callback({{value: value}})]));'''
+
+
+def install_script(name: str, script: str) -> str:
+    """ Returns a script that defines a helper running the body of an execute_script style script. """
+    return f'''{HELPERS} = {HELPERS} || {{}};
+{HELPERS}[{json.dumps(name)}] = function () {{
+{script}
+}};
+'''
+
+
+class ScriptRegistry:
+    """
+    Installs scripts into the page as named helpers once per document, so later calls only send the name and the
+    arguments. Scripts are written like any execute_script script and are installed with their first call. A call in a
+    document that lost the helper, e.g. after the page navigated by itself, is retried with the full script.
+
+    On Chrome the helpers are also pinned to new documents with Page.addScriptToEvaluateOnNewDocument, so they survive
+    navigation. Elsewhere they are installed again with the first call after a navigation or switch.
+
+    stats holds, per helper, the 'installs' that sent the full script, the 'calls' that only sent the name and the
+    'misses' where the helper was gone.
+    """
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.stats = {}
+        self._installed = {}
+        self._pinned = set()
+        self._pinning = True
+
+    def pin(self, source: str) -> bool:
+        """ Runs a script at the start of every new document where the driver supports it and returns if it does. """
+        if not self._pinning:
+            return False
+        try:
+            self.browser.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': source})
+        except (AttributeError, WebDriverException):
+            # Only Chrome's local driver can send DevTools commands.
+            self._pinning = False
+            return False
+        return True
+
+    def call(self, name: str, script: str, *args):
+        """ Runs a script as the named helper and returns its result. """
+        return self._call(name, script, args, self.browser.execute_script, CALL_SCRIPT)
+
+    def call_async(self, name: str, script: str, *args):
+        """ Runs an asynchronous script as the named helper and returns the value it calls back with. """
+        return self._call(name, script, args, self.browser.execute_async_script, CALL_ASYNC_SCRIPT)
+
+    def _call(self, name, script, args, execute, call_script):
+        stats = self.stats.setdefault(name, {'installs': 0, 'calls': 0, 'misses': 0})
+        if name in self._pinned or self._installed.get(name) == self.browser._context_changes:
+            stats['calls'] += 1
+            result = execute(call_script, name, list(args)) or {}
+            if not result.get('missing'):
+                return result.get('value')
+            stats['misses'] += 1
+        install = install_script(name, script)
+        if name not in self._pinned and self.pin(install):
+            self._pinned.add(name)
+        stats['installs'] += 1
+        result = execute(install + call_script, name, list(args)) or {}
+        self._installed[name] = self.browser._context_changes
+        return result.get('value')
+
+
+class InlineScripts:
+    """ Stands in for the registry where helpers can't be kept, sending the full script with every call. """
+
+    def __init__(self, browser):
+        self.browser = browser
+
+    def pin(self, source: str) -> bool:
+        return False
+
+    def call(self, name: str, script: str, *args):
+        return self.browser.execute_script(script, *args)
+
+    def call_async(self, name: str, script: str, *args):
+        return self.browser.execute_async_script(script, *args)
@@ -0,0 +1,51 @@
+import gzip
+import json
+import time
+
+# Bumped whenever the layout of the file changes so old files are rejected instead of half restored.
+SESSION_STATE_VERSION = 1
+
+
+class SessionStateError(Exception):
+    """ Thrown when a saved session state is missing, unreadable, expired or couldn't be captured or restored. """
+
+    pass
+
+
+def write_session_state(path, state: dict) -> None:
+    """ Writes a session state as gzipped, compact JSON. """
+    data = json.dumps(dict(state, version=SESSION_STATE_VERSION), separators=(',', ':')).encode('utf-8')
+    with gzip.open(path, 'wb') as f:
+        f.write(data)
+
+
+def read_session_state(path, now: (None, float) = None) -> dict:
+    """
+    Reads a session state and checks that it is still valid.
+
+    :param path: File written by write_session_state.
+    :param now: The time to check the expiry against. (Default: time.time())
+    :raises SessionStateError: If the file is missing, unreadable, from another version or expired.
+    """
+    try:
+        with gzip.open(path, 'rb') as f:
+            state = json.loads(f.read().decode('utf-8'))
+    except FileNotFoundError:
+        raise SessionStateError(f'No session state at {path}.') from None
+    except (OSError, EOFError, ValueError) as e:
+        raise SessionStateError(f'Session state at {path} is unreadable: {e}') from e
+    if not isinstance(state, dict) or state.get('version') != SESSION_STATE_VERSION:
+        raise SessionStateError(f'Session state at {path} is not version {SESSION_STATE_VERSION}.')
+    if now is None:
+        now = time.time()
+    if state.get('expires') is not None and state['expires'] <= now:
+        raise SessionStateError(f'Session state at {path} expired at {time.ctime(state["expires"])}.')
+    return state
+
+
+def session_state_expiry(cookies: list, created: float, max_age: (None, float) = None) -> (None, float):
+    """ Returns when a state expires: after max_age or when its first persistent cookie does, whichever is sooner. """
+    expiries = [cookie['expiry'] for cookie in cookies if cookie.get('expiry') is not None]
+    if max_age is not None:
+        expiries.append(created + max_age)
+    return min(expiries) if expiries else None
@@ -22,6 +22,7 @@ class Window:
         # Store the parent window and frame to access when we leave the child window.
         if not self.parent_window:
             self.parent_window = self.browser.current_window_handle
+        self.current_path = self.browser.frame_path
         self.current_frame = self.browser.frame
 
         # If the child window isn't defined, set it to the outermost window.
@@ -37,19 +38,12 @@ class Window:
         if self.child_window == self.parent_window:
             raise NoNewWindow(self.child_window)
 
-        # Switch to the child window.
+        # Switch to the child window. The browser syncs on the first command that interacts with it.
         self.browser.switch_to.window(self.child_window)
 
-        self.browser.angular = self.browser._test_angular()
-        self.browser.jquery = self.browser._test_jquery()
-
-        if self.browser.sync_angular:
-            self.browser.wait_for_angular()
-        if self.browser.sync_jquery:
-            self.browser.wait_for_jquery(self.browser._script_timeout)
-
     def __enter__(self):
-        self._switch_to()
+        with self.browser._window_hop():
+            self._switch_to()
         return self
 
     def _switch_from(self):
@@ -68,20 +62,16 @@ class Window:
             # Switches to the original frame if it's still valid.
             if self.remember_frame and self.current_frame:
                 try:
-                    self.browser.switch_to.frame(self.current_frame)
+                    if self.current_path is not None:
+                        self.browser.switch_to_frame_path(self.current_path)
+                    else:
+                        self.browser.switch_to.frame(self.current_frame)
                 except (NoSuchFrameException, StaleElementReferenceException):
                     pass
         except NoSuchWindowException:
             # Switches to default content if somehow the parent window was closed.
             self.browser.switch_to.window(self.browser.window_handles[0])
 
-        self.browser.angular = self.browser._test_angular()
-        self.browser.jquery = self.browser._test_jquery()
-
-        if self.browser.sync_angular:
-            self.browser.wait_for_angular()
-        if self.browser.sync_jquery:
-            self.browser.wait_for_jquery(self.browser._script_timeout)
-
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self._switch_from()
+        with self.browser._window_hop():
+            self._switch_from()